@@ -0,0 +1,36 @@
+import argparse
+from benchmark import suite
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description='Mede o desempenho do renderizador nas cenas do projeto')
+    parser.add_argument('cases', nargs='*', help='casos a executar (padrão: todos)')
+    parser.add_argument('--threads', type=int, default=1, help='processos de renderização')
+    parser.add_argument('--sizes', default=','.join(map(str, suite.SYNTHETIC_SIZES)), help='quantidades de objetos das cenas sintéticas')
+    parser.add_argument('--label', help='nome da execução no histórico')
+    parser.add_argument('--history', default=suite.HISTORY_PATH, help='arquivo JSON com o histórico')
+    parser.add_argument('--update-references', action='store_true', help='renderiza e salva as imagens de referência')
+    parser.add_argument('--list', action='store_true', help='lista os casos disponíveis')
+    args = parser.parse_args()
+
+    cases = args.cases or suite.list_cases([int(n) for n in args.sizes.split(',') if n])
+    if args.list:
+        print('\n'.join(cases))
+        return
+
+    if args.update_references:
+        suite.update_references(cases, args.threads)
+        return
+
+    history = suite.load_history(args.history)
+    entry = suite.run(cases, args.threads, args.label)
+    if history:
+        print(suite.compare(entry, history[-1]))
+
+    history.append(entry)
+    suite.save_history(history, args.history)
+    print(f'Resultados salvos em {args.history}')
+
+
+if __name__ == '__main__':
+    main()
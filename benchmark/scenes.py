@@ -0,0 +1,76 @@
+import numpy as np
+from utils.scene import Scene
+from utils.camera import Camera
+from objects.mesh import Cube
+from objects import Object, Sphere, Plane, Triangle
+from utils.material import Lambertian, Metal
+from lights.lights import AmbientLight, PointLight, DirectionalLight
+
+
+# Cenas sintéticas: N objetos espalhados numa caixa de 4x2x4 sobre um chão,
+# sempre com as mesmas posições para um mesmo N
+def build_synthetic(objects: list[Object], w_resolution=160, n_threads=1, debounces=2, n_samples=4, gamma_correction=True, **options) -> Scene:
+    aspect_ratio = 16/9
+    w_canvas = 200
+    resolution = (w_resolution, int(w_resolution / aspect_ratio))
+    camera = Camera(
+        resolution,
+        np.array([0., 3., -6.]),
+        np.array([0., 0.8, 0.]),
+        n_threads=n_threads,
+        distance=1.2,
+        windowSize=np.array([w_canvas, w_canvas / aspect_ratio], dtype=np.float64),
+        debounces=debounces,
+        n_samples=n_samples,
+        gamma_correction=gamma_correction,
+        **options,
+    )
+
+    floor = Plane(np.array([0., 0., 0.]), np.array([0., 1., 0.]), Lambertian(np.array([200., 200., 200.]), 1.0))
+    lights = [
+        AmbientLight(0.1),
+        PointLight(np.array([0., 4., -2.]), 0.6),
+        DirectionalLight(np.array([-1., -1., 1.]), 0.4),
+    ]
+    return Scene(*resolution, camera, [floor, *objects], lights)
+
+
+def random_material(rng: np.random.Generator):
+    color = rng.uniform(50., 255., 3)
+    if rng.random() < 0.25:
+        return Metal(color, 1.0, reflectivity=0.8, roughness=0.2, fuzz=0.1)
+
+    return Lambertian(color, 1.0)
+
+
+def build_spheres(n: int, **options) -> Scene:
+    rng = np.random.default_rng(n)
+    radius = 0.5 / np.cbrt(n)
+    spheres = [
+        Sphere(rng.uniform([-2., radius, -2.], [2., 2., 2.]), radius, random_material(rng))
+        for _ in range(n)
+    ]
+    return build_synthetic(spheres, **options)
+
+
+def build_cubes(n: int, **options) -> Scene:
+    rng = np.random.default_rng(n)
+    size = 0.8 / np.cbrt(n)
+    cubes = []
+    for _ in range(n):
+        cube = Cube(random_material(rng))
+        cube.scale(size, size, size).rotateY(rng.uniform(0., np.pi)).translate(rng.uniform([-2., 0., -2.], [2., 2., 2.]))
+        cubes.append(cube)
+
+    return build_synthetic(cubes, **options)
+
+
+def build_triangles(n: int, **options) -> Scene:
+    rng = np.random.default_rng(n)
+    size = 1.2 / np.sqrt(n)
+    triangles = []
+    for _ in range(n):
+        A = rng.uniform([-2., 0., -2.], [2., 2., 2.])
+        triangles.append(Triangle(A, A + rng.uniform(-size, size, 3), A + rng.uniform(-size, size, 3), random_material(rng)))
+
+    return build_synthetic(triangles, **options)
@@ -0,0 +1,194 @@
+import os
+import cv2
+import json
+import time
+import resource
+import subprocess
+import numpy as np
+import multiprocessing as mp
+from datetime import datetime
+from benchmark import scenes
+
+
+SEED = 1
+REFERENCE_SCALE = 16
+REFERENCES_PATH = os.path.join('benchmark', 'references')
+HISTORY_PATH = os.path.join('benchmark', 'history.json')
+SYNTHETIC_SIZES = (64, 512)
+
+# Resolução e amostras fixas por caso; as cenas originais mantêm o modo e os rebatimentos
+CASES = {
+    'snowman': ('main', {'w_resolution': 160, 'n_samples': 4}),
+    'classroom': ('old_scenarios.classroom', {'w_resolution': 160, 'n_samples': 1, 'debounces': 2}),
+    'pathtracing_room': ('old_scenarios.pathtracing_room', {'w_resolution': 160, 'n_samples': 2, 'debounces': 2}),
+}
+SYNTHETIC = {
+    'spheres': scenes.build_spheres,
+    'cubes': scenes.build_cubes,
+    'triangles': scenes.build_triangles,
+}
+
+
+def list_cases(sizes=SYNTHETIC_SIZES) -> list[str]:
+    return [*CASES, *(f'{name}-{n}' for name in SYNTHETIC for n in sizes)]
+
+
+def build_case(name: str, **options):
+    if name in CASES:
+        module, defaults = CASES[name]
+        build = __import__(module, fromlist=['build_scene']).build_scene
+        return build(**{**defaults, **options})
+
+    kind, _, n = name.rpartition('-')
+    if kind not in SYNTHETIC or not n.isdigit():
+        raise ValueError(f'Caso de benchmark inválido: {name}')
+
+    return SYNTHETIC[kind](int(n), **options)
+
+
+def reference_path(name: str) -> str:
+    return os.path.join(REFERENCES_PATH, f'{name}.png')
+
+
+def render_case(name: str, n_threads: int, reference: bool) -> tuple[dict, np.ndarray]:
+    np.random.seed(SEED)
+
+    # Uma renderização minúscula carrega os kernels nos processos antes da medição
+    warmup = build_case(name, w_resolution=16, n_samples=1, n_threads=n_threads, seed=SEED)
+    warmup.render()
+
+    scene = build_case(name, n_threads=n_threads, seed=SEED)
+    camera = scene.camera
+    if reference:
+        camera.n_samples *= REFERENCE_SCALE
+    scene.renderer = warmup.renderer
+    scene.collectStats = True
+
+    elapsed = scene.render()
+    summary = scene.renderer.getStats()
+    image = np.array(camera.buffer)
+    scene.close()
+
+    result = {
+        'resolution': [int(value) for value in camera.resolution],
+        'samples': camera.n_samples,
+        'mode': camera.mode,
+        'debounces': camera.debounces,
+        'threads': n_threads,
+        'wallTime': elapsed,
+        'rays': summary['rays']['total'],
+        'raysPerSecond': summary['rays']['total'] / elapsed,
+        # ru_maxrss vem em KB no Linux
+        'peakRss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'peakWorkerRss': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        'stats': {key: value for key, value in summary.items() if key != 'workers'},
+    }
+    return result, image
+
+
+def run_case(name: str, n_threads: int, reference: bool, results: mp.Queue):
+    try:
+        results.put(render_case(name, n_threads, reference))
+    except Exception as error:
+        results.put(error)
+
+
+def measure(name: str, n_threads: int, reference=False) -> tuple[dict, np.ndarray]:
+    # Cada caso roda num processo novo para que o pico de memória seja só dele
+    context = mp.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=run_case, args=(name, n_threads, reference, results))
+    process.start()
+    result = results.get()
+    process.join()
+    if isinstance(result, Exception):
+        raise result
+
+    return result
+
+
+def rmse(image: np.ndarray, name: str) -> float:
+    path = reference_path(name)
+    if not os.path.exists(path):
+        return None
+
+    # As referências ficam na orientação da tela; o buffer está de baixo para cima
+    reference = cv2.flip(cv2.cvtColor(cv2.imread(path), cv2.COLOR_BGR2RGB), 0).astype(np.float64)
+    if reference.shape != image.shape:
+        return None
+
+    return float(np.sqrt(np.mean((np.clip(image, 0., 255.) - reference) ** 2)))
+
+
+def save_reference(image: np.ndarray, name: str):
+    os.makedirs(REFERENCES_PATH, exist_ok=True)
+    image = np.round(np.clip(image, 0., 255.)).astype(np.uint8)
+    cv2.imwrite(reference_path(name), cv2.flip(cv2.cvtColor(image, cv2.COLOR_RGB2BGR), 0))
+
+
+def current_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path=HISTORY_PATH) -> list[dict]:
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_history(history: list[dict], path=HISTORY_PATH):
+    with open(path, 'w') as file:
+        json.dump(history, file, indent=2)
+
+
+def run(cases: list[str], n_threads: int, label: str = None, verbose=True) -> dict:
+    entry = {
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'commit': current_commit(),
+        'label': label,
+        'cases': {},
+    }
+    for name in cases:
+        t0 = time.time()
+        result, image = measure(name, n_threads)
+        result['rmse'] = rmse(image, name)
+        entry['cases'][name] = result
+        if verbose:
+            print(format_result(name, result) + f' ({time.time() - t0:.1f}s no total)')
+
+    return entry
+
+
+def update_references(cases: list[str], n_threads: int):
+    for name in cases:
+        result, image = measure(name, n_threads, reference=True)
+        save_reference(image, name)
+        print(f'{name}: referência com {result["samples"]} amostras salva em {reference_path(name)} ({result["wallTime"]:.1f}s)')
+
+
+def format_result(name: str, result: dict) -> str:
+    error = 'sem referência' if result['rmse'] is None else f'RMSE {result["rmse"]:.2f}'
+    return (
+        f'{name}: {result["wallTime"]:.2f}s, {result["raysPerSecond"]:.0f} raios/s, '
+        f'pico de memória {result["peakRss"]:.0f}MB (processos {result["peakWorkerRss"]:.0f}MB), {error}'
+    )
+
+
+def compare(entry: dict, previous: dict) -> str:
+    lines = [f'Comparação com {previous["date"]} ({previous.get("label") or previous.get("commit")}):']
+    for name, result in entry['cases'].items():
+        before = previous['cases'].get(name)
+        if before is None:
+            continue
+
+        line = f'  {name}: {before["wallTime"]:.2f}s -> {result["wallTime"]:.2f}s ({before["wallTime"] / result["wallTime"]:.2f}x)'
+        if result['rmse'] is not None and before.get('rmse') is not None:
+            line += f', RMSE {before["rmse"]:.2f} -> {result["rmse"]:.2f}'
+        lines.append(line)
+
+    return '\n'.join(lines)
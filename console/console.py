@@ -1,5 +1,7 @@
+import json
 import time
 from cmd import Cmd
+from utils import stats
 from utils.window import Window
 from console.camera import CameraConsole
 from console.lights import LightsConsole
@@ -9,6 +11,7 @@ from console.exceptions import StopConsole
 class Console(Cmd):
     LIST_OPTIONS = ['objects', 'lights']
     SELECT_OPTIONS = ['lights', 'camera']
+    STATS_OPTIONS = ['on', 'off', 'json']
 
     def __init__(self, window: Window, prompt: str):
         super().__init__()
@@ -46,10 +49,49 @@ class Console(Cmd):
             print('Sombras ativadas!')
         else:
             print('Sombras desativadas!')
+        self.window.relight()
 
     def help_shadows(self):
         print('Ativa/Desativa as sombras')
 
+    # Command STATS
+
+    def do_stats(self, arg: str):
+        args = arg.split()
+        scene = self.window.scene
+        match args[0].lower() if args else '':
+            case 'on' | 'off':
+                scene.collectStats = args[0].lower() == 'on'
+                print(f'Estatísticas {"ativadas" if scene.collectStats else "desativadas"}! Valem a partir da próxima renderização')
+                return
+            case 'json' | '':
+                pass
+            case _:
+                self.help_stats()
+                return
+
+        if scene.renderer is None or not scene.renderer.stats:
+            print('Nenhuma estatística coletada. Use "stats on" e renderize o cenário novamente')
+            return
+
+        summary = scene.renderer.getStats()
+        if not args:
+            print(stats.report(summary))
+        elif len(args) > 1:
+            with open(args[1], 'w') as file:
+                json.dump(summary, file, indent=2)
+            print(f'Estatísticas salvas em {args[1]}')
+        else:
+            print(json.dumps(summary, indent=2))
+
+    def complete_stats(self, text, *_):
+        return [option for option in self.STATS_OPTIONS if option.startswith(text)]
+
+    def help_stats(self):
+        print('Mostra as estatísticas da última renderização')
+        print('stats on/off - Ativa/Desativa a coleta de estatísticas')
+        print('stats json [arquivo] - Exporta as estatísticas em JSON')
+
     # Command LIST
 
     def __printObjects(self):
@@ -30,6 +30,7 @@ class LightsConsole(Cmd):
 
         light.on = True
         self.__print_lights()
+        self.window.relight()
 
     def do_off(self, args):
         args = args.split()
@@ -42,6 +43,7 @@ class LightsConsole(Cmd):
 
         light.on = False
         self.__print_lights()
+        self.window.relight()
 
     # Command EXIT
 
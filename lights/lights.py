@@ -14,11 +14,19 @@ class Light:
     def computeLight(self, point: np.ndarray, normal: np.ndarray, ray: Ray, material: Material):
         return 0
 
+    def computeLightBatch(self, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, shininess: np.ndarray) -> np.ndarray:
+        return np.zeros(len(points))
+
     def getDirection(self, point: np.ndarray):
         direction = self.position - point
         distance = np.linalg.norm(direction)
         return direction / distance, distance
 
+    def getDirections(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        directions = self.position - points
+        distances = np.linalg.norm(directions, axis=1)
+        return directions / distances[:, None], distances
+
     @property
     def ignoreShadow(self):
         return False
@@ -47,6 +55,10 @@ class PointLight(Light):
 
         return lightness
 
+    def computeLightBatch(self, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, shininess: np.ndarray) -> np.ndarray:
+        lightDirections, distances = self.getDirections(points)
+        return phong_batch(self.intensity, lightDirections, normals, directions, shininess, distances ** 0.5)
+
 class AmbientLight(Light):
     def __init__(self, intensity, color: np.ndarray = np.array([255., 255., 255.])):
         super().__init__(np.zeros(3), intensity, color)
@@ -54,6 +66,9 @@ class AmbientLight(Light):
     def computeLight(self):
         return self.intensity
 
+    def computeLightBatch(self, points: np.ndarray, *_) -> np.ndarray:
+        return np.full(len(points), self.intensity)
+
     @property
     def ignoreShadow(self):
         return True
@@ -79,9 +94,16 @@ class DirectionalLight(Light):
 
         return lightness
 
+    def computeLightBatch(self, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, shininess: np.ndarray) -> np.ndarray:
+        lightDirections = np.broadcast_to(self.direction, points.shape)
+        return phong_batch(self.intensity, lightDirections, normals, directions, shininess, np.ones(len(points)))
+
     def getDirection(self, point: np.ndarray):
         return self.direction, np.inf
 
+    def getDirections(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        return np.tile(self.direction, (len(points), 1)), np.full(len(points), np.inf)
+
 
 class SpotLight(Light):
     def __init__(self, position: np.ndarray, direction: np.ndarray, intensity: float, angle: float, color = np.array([255., 255., 255.])):
@@ -110,3 +132,26 @@ class SpotLight(Light):
             lightness += self.intensity * (dot2 ** material.shininess) / sqrtD
 
         return lightness
+
+    def computeLightBatch(self, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, shininess: np.ndarray) -> np.ndarray:
+        lightDirections, distances = self.getDirections(points)
+        lightness = phong_batch(self.intensity, lightDirections, normals, directions, shininess, distances ** 0.5)
+        lightness[lightDirections @ self.direction < self.cos] = 0
+        return lightness
+
+
+def phong_batch(intensity: float, lightDirections: np.ndarray, normals: np.ndarray, directions: np.ndarray, shininess: np.ndarray, attenuation: np.ndarray) -> np.ndarray:
+    dot = np.einsum('ij,ij->i', lightDirections, normals)
+    lit = dot > 0
+    lightness = np.where(lit, intensity * dot / attenuation, 0.)
+
+    specular = lit & (shininess != np.inf)
+    if specular.any():
+        r = 2 * dot[specular, None] * normals[specular] - lightDirections[specular]
+        dot2 = np.einsum('ij,ij->i', r, -directions[specular])
+        reflected = dot2 > 0
+        highlights = np.zeros(len(dot2))
+        highlights[reflected] = intensity * (dot2[reflected] ** shininess[specular][reflected]) / attenuation[specular][reflected]
+        lightness[specular] += highlights
+
+    return lightness
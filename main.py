@@ -1,6 +1,5 @@
 import numpy as np
 from utils.scene import Scene
-from utils.window import Window
 from utils.camera import Camera
 from objects import Object, Plane
 from objects.complex import Snowman
@@ -9,9 +8,9 @@ from utils.material import Texture, Material, Lambertian
 from lights.lights import Light, AmbientLight, DirectionalLight
 
 
-def main():
+def build_scene(w_resolution=800, n_threads=max(cpu_count()-1, 1), debounces=0, n_samples=64, gamma_correction=True, **options) -> Scene:
     aspect_ratio = 16/9
-    w_resolution, w_canvas = 800, 200
+    w_canvas = 200
     resolution = (w_resolution, int(w_resolution / aspect_ratio))
     camera_pos = np.array([0.3, 2.0, -0.7])
     camera_at = np.array([0., 1.6, 0.])
@@ -19,12 +18,13 @@ def main():
         resolution,
         camera_pos,
         camera_at,
-        n_threads=cpu_count()-1,
+        n_threads=n_threads,
         distance=0.8,
         windowSize=np.array([w_canvas, w_canvas / aspect_ratio], dtype=np.float64),
-        debounces=0,
-        n_samples=64,
-        gamma_correction=True,
+        debounces=debounces,
+        n_samples=n_samples,
+        gamma_correction=gamma_correction,
+        **options,
     )
 
     objects: list[Object] = []
@@ -53,7 +53,13 @@ def main():
 
     scene = Scene(*resolution, camera, objects, lights)
     scene.load_cubemap("snowny_mountain")
-    window = Window(scene, title="Cube")
+    return scene
+
+
+def main():
+    from utils.window import Window
+
+    window = Window(build_scene(), title="Cube")
     window.open()
     window.startLoop()
 
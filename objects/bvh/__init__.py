@@ -1 +1,2 @@
 from objects.bvh.bvh import BVH
+from objects.bvh.aabbTree import AABBTree
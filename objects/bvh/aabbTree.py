@@ -0,0 +1,157 @@
+import math
+import numpy as np
+from objects import Object
+
+
+TRAVERSAL_COST = 1.
+INTERSECTION_COST = 1.
+# A travessia nos kernels usa uma pilha de tamanho fixo (kernels.STACK_SIZE), que
+# precisa de profundidade + 1 posições
+MAX_DEPTH = 48
+
+
+def surface_area(boundsMin: np.ndarray, boundsMax: np.ndarray):
+    d = np.maximum(boundsMax - boundsMin, 0.)
+    return 2. * (d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] + d[..., 2] * d[..., 0])
+
+
+class AABBTree:
+    def __init__(self, primitives: list[Object], leafSize=4, n_bins=12):
+        self.leafSize = leafSize
+        self.n_bins = n_bins
+
+        # Planos são infinitos e ficam fora da árvore, testados em todo raio
+        self.unbounded: list[Object] = []
+        bounded: list[Object] = []
+        boundsMin, boundsMax = [], []
+        for primitive in primitives:
+            bounds = primitive.getBounds()
+            if bounds is None:
+                self.unbounded.append(primitive)
+                continue
+
+            bounded.append(primitive)
+            boundsMin.append(bounds[0])
+            boundsMax.append(bounds[1])
+
+        self.primBoundsMin = np.array(boundsMin, dtype=np.float64).reshape(-1, 3)
+        self.primBoundsMax = np.array(boundsMax, dtype=np.float64).reshape(-1, 3)
+        self.centroids = (self.primBoundsMin + self.primBoundsMax) / 2.
+
+        self.nodeMin, self.nodeMax = [], []
+        self.nodeRight, self.nodeAxis = [], []
+        self.nodeStart, self.nodeCount = [], []
+        self.order = np.arange(len(bounded))
+        self.depth = 0
+        if len(bounded) > 0:
+            self.__build(0, len(bounded))
+
+        self.primitives = [bounded[i] for i in self.order]
+        self.primBoundsMin = self.primBoundsMin[self.order]
+        self.primBoundsMax = self.primBoundsMax[self.order]
+        self.centroids = self.centroids[self.order]
+        self.nodeMin = np.array(self.nodeMin, dtype=np.float64).reshape(-1, 3)
+        self.nodeMax = np.array(self.nodeMax, dtype=np.float64).reshape(-1, 3)
+        self.nodeRight = np.array(self.nodeRight, dtype=np.int32)
+        self.nodeAxis = np.array(self.nodeAxis, dtype=np.int32)
+        self.nodeStart = np.array(self.nodeStart, dtype=np.int32)
+        self.nodeCount = np.array(self.nodeCount, dtype=np.int32)
+
+    def __len__(self):
+        return len(self.primitives) + len(self.unbounded)
+
+    def __pushNode(self, start: int, end: int):
+        indices = self.order[start:end]
+        self.nodeMin.append(self.primBoundsMin[indices].min(axis=0))
+        self.nodeMax.append(self.primBoundsMax[indices].max(axis=0))
+        self.nodeRight.append(-1)
+        self.nodeAxis.append(0)
+        self.nodeStart.append(start)
+        self.nodeCount.append(end - start)
+        return len(self.nodeMin) - 1
+
+    def __findSplit(self, start: int, end: int, node: int):
+        indices = self.order[start:end]
+        centroids = self.centroids[indices]
+        cMin, cMax = centroids.min(axis=0), centroids.max(axis=0)
+        parentArea = surface_area(self.nodeMin[node], self.nodeMax[node])
+
+        best = (np.inf, -1, None)
+        for axis in range(3):
+            extent = cMax[axis] - cMin[axis]
+            if extent <= 0.: continue
+
+            bins = ((centroids[:, axis] - cMin[axis]) / extent * self.n_bins).astype(np.int32)
+            bins = np.minimum(bins, self.n_bins - 1)
+            counts = np.bincount(bins, minlength=self.n_bins)
+
+            binMin = np.full((self.n_bins, 3), np.inf)
+            binMax = np.full((self.n_bins, 3), -np.inf)
+            np.minimum.at(binMin, bins, self.primBoundsMin[indices])
+            np.maximum.at(binMax, bins, self.primBoundsMax[indices])
+
+            leftCount = np.cumsum(counts)[:-1]
+            rightCount = np.cumsum(counts[::-1])[::-1][1:]
+            leftArea = surface_area(np.minimum.accumulate(binMin)[:-1], np.maximum.accumulate(binMax)[:-1])
+            rightArea = surface_area(
+                np.minimum.accumulate(binMin[::-1])[::-1][1:],
+                np.maximum.accumulate(binMax[::-1])[::-1][1:]
+            )
+
+            with np.errstate(invalid='ignore'):
+                costs = leftCount * leftArea + rightCount * rightArea
+            costs[(leftCount == 0) | (rightCount == 0)] = np.inf
+            split = int(np.argmin(costs))
+            if costs[split] < best[0]:
+                best = (costs[split], axis, bins <= split)
+
+        cost, axis, left = best
+        if axis < 0:
+            return None
+
+        cost = TRAVERSAL_COST + INTERSECTION_COST * cost / max(parentArea, 1e-12)
+        return cost, axis, left
+
+    def __medianSplit(self, start: int, end: int):
+        # Metade dos centroides de cada lado, no eixo de maior extensão
+        centroids = self.centroids[self.order[start:end]]
+        axis = int(np.argmax(centroids.max(axis=0) - centroids.min(axis=0)))
+        left = np.zeros(end - start, dtype=bool)
+        left[np.argsort(centroids[:, axis], kind='stable')[:(end - start) // 2]] = True
+        return 0., axis, left
+
+    def __build(self, start: int, end: int, depth=0):
+        node = self.__pushNode(start, end)
+        self.depth = max(self.depth, depth)
+        count = end - start
+        if count <= 1:
+            return node
+
+        # Geometria muito desigual pode aprofundar a SAH sem limite; perto de MAX_DEPTH
+        # a divisão pela mediana garante ceil(log2(count)) níveis até as folhas
+        if depth + math.ceil(math.log2(count)) >= MAX_DEPTH:
+            if count <= self.leafSize: return node
+            split = self.__medianSplit(start, end)
+        else:
+            split = self.__findSplit(start, end, node)
+        if split is None:
+            # Todos os centroides coincidem, então não há divisão útil
+            if count <= self.leafSize: return node
+            split = (0., 0, None)
+
+        cost, axis, left = split
+        if left is not None and count <= self.leafSize and cost >= INTERSECTION_COST * count:
+            return node
+
+        indices = self.order[start:end]
+        if left is None:
+            mid = start + count // 2
+        else:
+            self.order[start:end] = np.concatenate((indices[left], indices[~left]))
+            mid = start + int(np.count_nonzero(left))
+
+        self.nodeAxis[node] = axis
+        self.nodeCount[node] = 0
+        self.__build(start, mid, depth + 1)
+        self.nodeRight[node] = self.__build(mid, end, depth + 1)
+        return node
@@ -27,6 +27,10 @@ class Circle(Plane):
             self.normalP = c_void_p(self.normal.ctypes.data)
             self.radiusC = c_double(self.radius)
 
+    def getBounds(self) -> tuple[np.ndarray, np.ndarray]:
+        extent = self.radius * np.sqrt(np.maximum(0., 1. - self.normal ** 2))
+        return self.position - extent, self.position + extent
+
     def intersects(self, ray: Ray) -> np.ndarray:
         t = intersects(ray.originP, ray.directionP, ray.tC, self.positionP, self.normalP, self.radiusC)
         if t>0:
@@ -55,6 +55,11 @@ class Cone(Object):
             ray.t = t
             return ray.hitting_point
 
+    def getBounds(self) -> tuple[np.ndarray, np.ndarray]:
+        base = self.position - self.axis * self.height
+        extent = self.radius * np.sqrt(np.maximum(0., 1. - self.axis ** 2))
+        return np.minimum(self.position, base - extent), np.maximum(self.position, base + extent)
+
     def getNormal(self, point: np.ndarray) -> np.ndarray:
         v = point - self.position
         n = v - self.axis * (self.axis @ v)
@@ -81,7 +86,7 @@ class Cone(Object):
         else:
             self.axis = transforms.rotate(self.axis, angle, axis)
 
-    def getColor(self, point: np.ndarray):
+    def getColor(self, point: np.ndarray, footprint=0.):
         if self.material.texture is None:
             return self.material.color
 
@@ -94,4 +99,4 @@ class Cone(Object):
 
         u = angle / (np.pi)
         v = np.linalg.norm(po)
-        return self.material.texture.getColor(np.array([u, v]))
+        return self.material.texture.getColor(np.array([u, v]), footprint * max(1. / (np.pi * self.radius), 1.))
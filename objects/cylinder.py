@@ -53,12 +53,17 @@ class Cylinder(Object):
             ray.t = t
             return ray.hitting_point
 
+    def getBounds(self) -> tuple[np.ndarray, np.ndarray]:
+        top = self.position - self.axis * self.height
+        extent = self.radius * np.sqrt(np.maximum(0., 1. - self.axis ** 2))
+        return np.minimum(self.position, top) - extent, np.maximum(self.position, top) + extent
+
     def getNormal(self, point: np.ndarray) -> np.ndarray:
         w = point - self.position
         n = w - self.axis * (w @ self.axis)
         return transforms.normalize(n)
 
-    def getColor(self, point: np.ndarray):
+    def getColor(self, point: np.ndarray, footprint=0.):
         if self.material.texture is None:
             return self.material.color
 
@@ -71,4 +76,4 @@ class Cylinder(Object):
 
         u = angle / (2*np.pi)
         v = (po @ self.axis) / self.height
-        return self.material.texture.getColor(np.array([u, v]))
+        return self.material.texture.getColor(np.array([u, v]), footprint * max(1. / (2 * np.pi * self.radius), 1. / self.height))
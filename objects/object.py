@@ -1,3 +1,4 @@
+import ctypes
 import numpy as np
 from utils.ray import Ray
 from utils import transforms
@@ -18,6 +19,10 @@ class Object:
         self.superObject = None
         self.material = material
 
+    def __getstate__(self):
+        # Ponteiros do ctypes não podem ser enviados aos processos de renderização
+        return {key: None if isinstance(value, ctypes._SimpleCData) else value for key, value in self.__dict__.items()}
+
     def preCalc(self, reverse=False):
         pass
 
@@ -27,7 +32,10 @@ class Object:
     def getNormal(self, point: np.ndarray) -> np.ndarray:
         return None
 
-    def getColor(self, point: np.ndarray):
+    def getBounds(self) -> tuple[np.ndarray, np.ndarray]|None:
+        return None
+
+    def getColor(self, point: np.ndarray, footprint=0.):
         return self.material.getColor()
 
     def getDescription(self):
@@ -46,7 +46,7 @@ class Plane(Object):
             return ray.hitting_point
 
     def getNormal(self, point: np.ndarray) -> np.ndarray:
-        if self.material.texture is None or self.material.texture.normal_image is None:
+        if self.material.texture is None or self.material.texture.normal_path is None:
             return self.normal
 
         po = point - self.position
@@ -68,7 +68,7 @@ class Plane(Object):
         normal = normal_local @ tbn
         return transforms.normalize(normal)
 
-    def getColor(self, point: np.ndarray) -> np.ndarray:
+    def getColor(self, point: np.ndarray, footprint=0.) -> np.ndarray:
         if self.material.texture is None:
             return self.material.getColor()
 
@@ -80,4 +80,4 @@ class Plane(Object):
         if du < 0: angle = 2*np.pi - angle
 
         texture_point = transforms.rotate2D(np.array([1., 0.]), angle) * np.linalg.norm(po)
-        return self.material.texture.getColor(texture_point)
+        return self.material.texture.getColor(texture_point, footprint)
@@ -27,9 +27,12 @@ class Sphere(Object):
             self.positionP = c_void_p(self.position.ctypes.data)
             self.radiusC = c_double(self.radius)
 
+    def getBounds(self) -> tuple[np.ndarray, np.ndarray]:
+        return self.position - self.radius, self.position + self.radius
+
     def getNormal(self, point: np.ndarray) -> np.ndarray:
         geometric_normal = (point - self.position) / self.radius
-        if self.material.texture is None or self.material.texture.normal_image is None:
+        if self.material.texture is None or self.material.texture.normal_path is None:
             return geometric_normal
 
         p_rel = point - self.position
@@ -53,7 +56,7 @@ class Sphere(Object):
         world_space_normal = tbn @ normal_from_map
         return transforms.normalize(world_space_normal)
 
-    def getColor(self, point):
+    def getColor(self, point, footprint=0.):
         if self.material.texture is None:
             return self.material.color
 
@@ -64,7 +67,7 @@ class Sphere(Object):
         u = (theta + math.pi) / (2 * math.pi)
         v = 1.0 - (phi / math.pi)
 
-        return self.material.texture.getColor((u, v))
+        return self.material.texture.getColor((u, v), footprint / (math.pi * self.radius))
 
     def intersects(self, ray: Ray) -> np.ndarray:
         t = intersects(ray.originP, ray.directionP, ray.tC, self.positionP, self.radiusC)
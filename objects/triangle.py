@@ -44,6 +44,10 @@ class Triangle(Plane):
             self.areaC = c_double(self.area)
 
 
+    def getBounds(self) -> tuple[np.ndarray, np.ndarray]:
+        vertices = np.array([self.A, self.B, self.C])
+        return vertices.min(axis=0), vertices.max(axis=0)
+
     def intersects(self, ray: Ray) -> np.ndarray:
         t = intersects(ray.originP, ray.directionP, ray.tC, self.positionP, self.normalP, self.AP, self.BP, self.CP, self.areaC)
         if t>0:
@@ -1,14 +1,11 @@
 import math
-import pygame
 import numpy as np
 from objects.bvh import BVH
 from utils import transforms
 from threading import Thread
 from utils.scene import Scene
-from utils.window import Window
 from utils.camera import Camera
 from objects import Sphere, Plane
-from console.console import Console
 from objects.mesh import Cube, Ramp
 from multiprocessing import cpu_count
 from objects.complex.table import Table
@@ -18,9 +15,9 @@ from objects.complex import Snowman, BasedCylinder, NatalTree
 from lights.lights import AmbientLight, PointLight, DirectionalLight, SpotLight
 
 
-def main():
+def build_scene(w_resolution=1000, n_threads=max(cpu_count()-1, 1), debounces=5, n_samples=100, gamma_correction=True, **options) -> Scene:
     aspect_ratio = 16/9
-    w_resolution, w_canvas = 1000, 200
+    w_canvas = 200
     resolution = (w_resolution, int(w_resolution / aspect_ratio))
     camera_pos = np.array([0., 3.5, -6.0])
     camera_at = np.array([0., 1., 0.])
@@ -28,12 +25,13 @@ def main():
         resolution,
         camera_pos,
         camera_at,
-        n_threads=cpu_count()-1,
+        n_threads=n_threads,
         distance=1.4,
         windowSize=np.array([w_canvas, w_canvas / aspect_ratio], dtype=np.float64),
-        debounces=5,
-        n_samples=100,
-        gamma_correction=True,
+        debounces=debounces,
+        n_samples=n_samples,
+        gamma_correction=gamma_correction,
+        **options,
     )
 
     stairHeight = 0.30
@@ -161,8 +159,13 @@ def main():
         DirectionalLight(np.array([-1., -0.5, 1.0]), 0.7),
         # AmbientLight(0.05)
     ]
-    scene = Scene(*resolution, camera, objects, lights)
-    window = Window(scene, title="Cube")
+    return Scene(*resolution, camera, objects, lights)
+
+
+def main():
+    from utils.window import Window
+
+    window = Window(build_scene(), title="Cube")
 
     window.open()
     window.startLoop()
@@ -1,10 +1,8 @@
 import math
-import pygame
 import numpy as np
 from utils import transforms
 from threading import Thread
 from utils.scene import Scene
-from utils.window import Window
 from utils.camera import Camera
 from objects import Sphere, Plane
 from multiprocessing import cpu_count
@@ -12,9 +10,9 @@ from utils.material import Material, Lambertian, Metal
 from lights.lights import AmbientLight, PointLight, DirectionalLight, SpotLight
 
 
-def main():
+def build_scene(w_resolution=400, n_threads=max(cpu_count()-1, 1), debounces=5, n_samples=500, gamma_correction=True, **options) -> Scene:
     aspect_ratio = 16/9
-    w_resolution, w_canvas = 400, 200
+    w_canvas = 200
     resolution = (w_resolution, int(w_resolution / aspect_ratio))
     camera_pos = np.array([0., 1., -2.9])
     camera_at = np.array([0., 1., 0.])
@@ -22,12 +20,13 @@ def main():
         resolution,
         camera_pos,
         camera_at,
-        n_threads=cpu_count()-1,
+        n_threads=n_threads,
         distance=0.8,
         windowSize=np.array([w_canvas, w_canvas / aspect_ratio], dtype=np.float64),
-        debounces=5,
-        n_samples=500,
-        gamma_correction=True,
+        debounces=debounces,
+        n_samples=n_samples,
+        gamma_correction=gamma_correction,
+        **options,
     )
 
     spheres = [
@@ -116,8 +115,13 @@ def main():
         *spheres,
         *planes,
     ]
-    scene = Scene(*resolution, camera, objects, lights)
-    window = Window(scene, title="Cube")
+    return Scene(*resolution, camera, objects, lights)
+
+
+def main():
+    from utils.window import Window
+
+    window = Window(build_scene(), title="Cube")
     window.open()
     window.startLoop()
 
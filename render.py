@@ -0,0 +1,99 @@
+import os
+import time
+import argparse
+import importlib.util
+from threading import Thread
+from utils import stats
+from utils.scene import Scene, format_time
+
+
+def load_scene(path: str, **options) -> Scene:
+    # O arquivo da cena precisa expor build_scene(w_resolution, n_threads, **opções da câmera)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Cena não encontrada em {path}')
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not hasattr(module, 'build_scene'):
+        raise AttributeError(f'{path} não define build_scene')
+
+    return module.build_scene(**options)
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m render', description='Renderiza uma cena sem abrir a janela')
+    parser.add_argument('scene', help='arquivo da cena, ex.: main.py')
+    parser.add_argument('--out', default='frame.png', help='imagem de saída')
+    parser.add_argument('--samples', type=int, help='amostras por pixel')
+    parser.add_argument('--threads', type=int, default=os.cpu_count(), help='processos de renderização')
+    parser.add_argument('--width', type=int, help='largura da imagem em pixels')
+    parser.add_argument('--mode', help='recursive, wavefront ou pathtracing')
+    parser.add_argument('--debounces', type=int, help='número de rebatimentos')
+    parser.add_argument('--seed', type=int, help='semente para uma imagem reprodutível')
+    parser.add_argument('--precision', choices=('float32', 'float64'), help='precisão do sombreamento e dos buffers de acumulação (padrão: float32)')
+    parser.add_argument('--checkpoint', help='pasta do checkpoint; retoma dela se já existir')
+    parser.add_argument('--checkpoint-interval', type=float, help='segundos entre checkpoints')
+    parser.add_argument('--stats', action='store_true', help='coleta e mostra as estatísticas da renderização')
+    args = parser.parse_args()
+
+    options = {
+        key: value for key, value in (
+            ('w_resolution', args.width),
+            ('n_samples', args.samples),
+            ('mode', args.mode),
+            ('debounces', args.debounces),
+            ('seed', args.seed),
+            ('precision', args.precision),
+            ('checkpoint', args.checkpoint),
+            ('checkpoint_interval', args.checkpoint_interval),
+        ) if value is not None
+    }
+    scene = load_scene(args.scene, n_threads=args.threads, **options)
+    scene.collectStats = args.stats
+
+    errors = []
+    def render():
+        try:
+            scene.render()
+        except Exception as error:
+            errors.append(error)
+
+    t0 = time.time()
+    thread = Thread(target=render, daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+            if hasattr(scene.camera, 'shared_progress'):
+                print(f'\rRenderizando cenário: {scene.camera.getProgress() * 100:.2f}%', end='')
+    except KeyboardInterrupt:
+        # Interrompe no fim do passo atual e salva o que já foi acumulado; os processos
+        # ignoram o Ctrl-C, então a cena só é fechada depois que o passo termina
+        scene.camera.stop()
+        print('\nInterrompendo no fim do passo atual...')
+        while thread.is_alive():
+            try:
+                thread.join(0.5)
+            except KeyboardInterrupt:
+                pass
+
+    if errors:
+        scene.close()
+        raise errors[0]
+
+    if scene.camera.stopped:
+        print(f'\rRenderização interrompida em {format_time(time.time() - t0)}!   ')
+    else:
+        print(f'\rCenário renderizado em {format_time(time.time() - t0)}!   ')
+    if scene.renderer is not None and scene.renderer.stats:
+        print(stats.report(scene.renderer.getStats()))
+
+    scene.saveImage(args.out)
+    scene.close()
+    print(f'Imagem salva em {args.out}')
+
+
+if __name__ == '__main__':
+    main()
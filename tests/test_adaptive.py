@@ -0,0 +1,36 @@
+import numpy as np
+from benchmark import suite
+
+RESOLUTION = (48, 27)
+
+
+def render(**options) -> tuple[np.ndarray, np.ndarray]:
+    scene = suite.build_case('spheres-64', w_resolution=RESOLUTION[0], n_threads=2, seed=suite.SEED, **options)
+    try:
+        scene.render()
+        camera = scene.camera
+        counts = np.array(camera.sampleCounts) if camera.accumulating else None
+        return np.array(camera.buffer, dtype=np.float64), counts
+    finally:
+        scene.close()
+
+
+def test_adaptive_stays_within_budget():
+    _, counts = render(n_samples=8, adaptive=True, max_samples=32)
+    assert counts.sum() <= RESOLUTION[0] * RESOLUTION[1] * 8
+    assert counts.max() <= 32
+
+    _, counts = render(n_samples=8, adaptive=True, max_samples=16, sample_budget=5000)
+    assert counts.sum() <= 5000
+    assert counts.max() <= 16
+
+
+def test_adaptive_converges_to_fixed_samples():
+    # Com o mesmo orçamento, a média adaptativa fica tão perto da referência quanto a fixa
+    reference, _ = render(n_samples=64)
+    fixed, _ = render(n_samples=8)
+    adaptive, _ = render(n_samples=8, adaptive=True, max_samples=32)
+
+    assert abs(adaptive.mean() - reference.mean()) < 0.01 * reference.mean()
+    rmse = lambda image: np.sqrt(np.mean((image - reference) ** 2))
+    assert rmse(adaptive) <= rmse(fixed)
@@ -0,0 +1,19 @@
+import numpy as np
+from objects import Sphere
+from objects.bvh import AABBTree
+from objects.bvh.aabbTree import MAX_DEPTH
+from utils.compiledScene import CompiledScene
+from utils.material import Lambertian
+
+
+def test_depth_is_capped_on_uneven_geometry():
+    # Esferas espaçadas exponencialmente fazem a SAH separar uma por vez
+    material = Lambertian(np.array([200., 200., 200.]), 1.)
+    spheres = [Sphere(np.array([3. ** i, 0., 0.]), 0.1 * 3. ** i, material) for i in range(120)]
+    tree = AABBTree(spheres)
+    assert tree.depth <= MAX_DEPTH
+
+    compiled = CompiledScene(tree)
+    for i, sphere in enumerate(spheres):
+        _, prim = compiled.intersect(np.array([3. ** i, 0., -3. ** i]), np.array([0., 0., 1.]), np.inf)
+        assert compiled.primitives[prim] is sphere
@@ -0,0 +1,26 @@
+import numpy as np
+from benchmark import suite
+
+
+def render(tmp_path, n_samples: int, checkpoint=True) -> np.ndarray:
+    options = {'checkpoint': str(tmp_path / 'checkpoint')} if checkpoint else {}
+    scene = suite.build_case('spheres-64', w_resolution=48, n_samples=n_samples, n_threads=2, seed=suite.SEED, progressive=True, sampler='sobol', **options)
+    try:
+        scene.render()
+        return np.array(scene.camera.buffer)
+    finally:
+        scene.close()
+
+
+def test_resumed_render_matches_uninterrupted(tmp_path, capsys):
+    # Os passos salvos no checkpoint continuam a mesma sequência de amostras
+    render(tmp_path, 3)
+    resumed = render(tmp_path, 6)
+    assert 'passo 3' in capsys.readouterr().out
+    assert np.array_equal(resumed, render(tmp_path, 6, checkpoint=False))
+
+
+def test_resume_skips_finished_passes(tmp_path, capsys):
+    first = render(tmp_path, 3)
+    assert np.array_equal(render(tmp_path, 3), first)
+    assert 'Retomando' in capsys.readouterr().out
@@ -0,0 +1,50 @@
+import numpy as np
+from benchmark import scenes
+from objects import Sphere
+from utils.material import Lambertian
+
+
+def build(position: np.ndarray):
+    sphere = Sphere(position, 0.3, Lambertian(np.array([200., 50., 50.]), 1.0))
+    scene = scenes.build_synthetic([sphere], w_resolution=64, n_threads=2, debounces=0, seed=1)
+    return scene, sphere
+
+
+def render_moved(start: np.ndarray, end: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    scene, sphere = build(start)
+    try:
+        scene.render()
+        before = scene.getBounds(sphere)
+        sphere.translate(end - start)
+        scene.moved(sphere, before)
+        scene.render()
+        # Só parte dos tiles é refeita
+        assert scene.camera.region is not None
+        assert len(scene.camera.region) < len(scene.camera.scheduler.tiles)
+        partial = np.array(scene.camera.buffer)
+    finally:
+        scene.close()
+
+    scene, _ = build(end)
+    try:
+        scene.render()
+        return partial, np.array(scene.camera.buffer)
+    finally:
+        scene.close()
+
+
+def test_dirty_region_matches_full_render():
+    partial, full = render_moved(np.array([0., 0.5, 0.]), np.array([0.4, 0.5, 0.]))
+    assert np.array_equal(partial, full)
+
+
+def test_dirty_region_with_old_footprint_off_screen():
+    # A esfera começa cortada pela borda esquerda da imagem
+    start = np.array([-5.3, 0.5, 0.])
+    scene, _ = build(start)
+    x = scene.camera.project(start[None])[0, 0]
+    scene.close()
+    assert -5 < x < 5
+
+    partial, full = render_moved(start, np.array([-4., 0.5, 0.]))
+    assert np.array_equal(partial, full)
@@ -0,0 +1,30 @@
+import numpy as np
+from benchmark import suite
+
+
+def render_mean(case: str, ambient=True, **options) -> float:
+    scene = suite.build_case(case, w_resolution=48, n_samples=16, n_threads=2, seed=suite.SEED, **options)
+    for light in scene.lights:
+        if light.ignoreShadow:
+            light.on = ambient
+    try:
+        scene.render()
+        return float(np.mean(scene.camera.buffer))
+    finally:
+        scene.close()
+
+
+def test_direct_light_matches_recursive():
+    # Sem rebatimentos os dois modos calculam só a luz direta e a ambiente
+    for case in ('snowman', 'spheres-64'):
+        recursive = render_mean(case, mode='recursive', debounces=0)
+        pathtracing = render_mean(case, mode='pathtracing', debounces=0)
+        assert abs(pathtracing - recursive) < 0.05 * recursive, (case, recursive, pathtracing)
+
+
+def test_bounces_do_not_count_ambient_twice():
+    # Com rebatimentos o céu já ilumina os caminhos que escapam, então a luz ambiente
+    # só pode pesar pouco perto do que ela acrescenta à renderização recursiva
+    recursive = render_mean('snowman', mode='recursive', debounces=0) - render_mean('snowman', False, mode='recursive', debounces=0)
+    pathtracing = render_mean('snowman', mode='pathtracing', debounces=2) - render_mean('snowman', False, mode='pathtracing', debounces=2)
+    assert pathtracing < 0.25 * recursive, (recursive, pathtracing)
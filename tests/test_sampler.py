@@ -0,0 +1,46 @@
+import numpy as np
+from utils.sampler import SAMPLERS, getSampler
+
+N_SAMPLES = 64
+
+
+def get_points(name: str, seed: int, pixel: int, dimension: int) -> np.ndarray:
+    # O amostrador aleatório e o estratificado usam o gerador global do numpy
+    np.random.seed(seed)
+    sampler = getSampler(name, N_SAMPLES, seed)
+    return sampler.get2D(np.full(N_SAMPLES, pixel), np.arange(N_SAMPLES), dimension)
+
+
+def centered_discrepancy(points: np.ndarray) -> float:
+    # Discrepância L2 centrada de Hickernell, que tem forma fechada
+    n = len(points)
+    a = np.abs(points - 0.5)
+    first = np.prod(1 + 0.5 * a - 0.5 * a ** 2, axis=1).sum() * 2 / n
+    distances = np.abs(points[:, None] - points[None, :])
+    second = np.prod(1 + 0.5 * a[:, None] + 0.5 * a[None, :] - 0.5 * distances, axis=2).sum() / n ** 2
+    return float(np.sqrt((13 / 12) ** 2 - first + second))
+
+
+def test_points_stay_in_unit_square():
+    for name in SAMPLERS:
+        for pixel in range(8):
+            for dimension in range(4):
+                points = get_points(name, 1, pixel, dimension)
+                assert points.shape == (N_SAMPLES, 2)
+                assert (points >= 0.).all() and (points < 1.).all(), name
+
+
+def test_fixed_seed_is_reproducible():
+    for name in SAMPLERS:
+        first = get_points(name, 7, 3, 1)
+        assert np.array_equal(first, get_points(name, 7, 3, 1)), name
+        assert not np.array_equal(first, get_points(name, 8, 3, 1)), name
+
+
+def test_low_discrepancy_beats_random():
+    def mean_discrepancy(name: str) -> float:
+        return np.mean([centered_discrepancy(get_points(name, 1, pixel, dimension)) for pixel in range(10) for dimension in range(3)])
+
+    random = mean_discrepancy('random')
+    for name in ('halton', 'sobol'):
+        assert mean_discrepancy(name) < 0.5 * random, name
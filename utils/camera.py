@@ -1,16 +1,26 @@
+import cv2
+import time
 import numba
-import ctypes
 import numpy as np
 from utils.ray import Ray
 from objects import Object
-from utils import transforms
-import multiprocessing as mp
+from utils import transforms, stats
+from utils.scheduler import TileScheduler
+from utils.sampler import getSampler
+from utils.checkpoint import Checkpoint
 
 BLACK = np.array([0., 0., 0.])
 SKY_COLOR = np.array([203., 224., 233.])
+RENDER_MODES = ('recursive', 'wavefront', 'pathtracing')
+PRECISIONS = {'float32': np.float32, 'float64': np.float64}
+CONFIDENCE_Z = 1.96
+ROULETTE_DEPTH = 3
 
 class Camera():
-    def __init__(self, resolution: tuple[int, int], position: np.ndarray, at: np.ndarray, rotation=0, distance=1., perpendicular=False, n_threads=1, windowSize=None, debounces=0, n_samples=1, gamma_correction=False):
+    def __init__(self, resolution: tuple[int, int], position: np.ndarray, at: np.ndarray, rotation=0, distance=1., perpendicular=False, n_threads=1, windowSize=None, debounces=0, n_samples=1, gamma_correction=False, mode='recursive', tile_size=16, progressive=False, adaptive=False, min_samples=4, max_samples=None, sample_budget=None, adaptive_threshold=2., sampler='random', seed=None, heatmap=False, checkpoint=None, checkpoint_interval=60., gbuffer=False, precision='float32'):
+        assert mode in RENDER_MODES, f'Modo de renderização inválido: {mode}'
+        assert precision in PRECISIONS, f'Precisão inválida: {precision}'
+        assert not (gbuffer and adaptive), 'O G-buffer não suporta amostragem adaptativa'
         from utils.scene import Scene
         self.scene: Scene = None
 
@@ -18,7 +28,14 @@ class Camera():
         self.at = at
         self.direction = transforms.normalize(at - position)
         self.resolution = np.array([*resolution], dtype=np.int32)
-        self.buffer = np.zeros((*resolution[::-1], 3), dtype=np.float64)
+        # Os buffers de ponto flutuante guardam a média e as cores das amostras também são
+        # sombreadas nessa precisão; a interseção fica em float64, já que as correções
+        # contra autointerseção dos kernels supõem precisão dupla. display é a cópia em
+        # bytes que vai para a tela
+        self.precision = precision
+        self.dtype = PRECISIONS[precision]
+        self.buffer = np.zeros((*resolution[::-1], 3), dtype=self.dtype)
+        self.display = np.zeros((*resolution[::-1], 3), dtype=np.uint8)
         self.perpendicular = perpendicular
         self.windowSize = self.resolution
         if windowSize is not None: self.windowSize = np.array([*windowSize], dtype=np.int32)
@@ -29,6 +46,44 @@ class Camera():
         self.debounces = debounces
         self.n_samples = n_samples
         self.gamma_correction = gamma_correction
+        self.mode = mode
+        self.scheduler = TileScheduler(tile_size)
+        # Checkpoints são gravados entre passos, então exigem a renderização progressiva
+        self.progressive = progressive or checkpoint is not None
+        self.adaptive = adaptive
+        self.min_samples = max(min_samples, 2)
+        self.max_samples = max_samples if max_samples is not None else 4 * n_samples
+        self.sample_budget = sample_budget
+        self.adaptive_threshold = adaptive_threshold
+        self.checkpoint = Checkpoint(checkpoint) if checkpoint is not None else None
+        self.checkpoint_interval = checkpoint_interval
+        if seed is None and checkpoint is not None:
+            seed = int(np.random.randint(2 ** 31))
+        self.sampler = getSampler(sampler, self.max_samples if adaptive else n_samples, seed or 0)
+        self.seed = seed
+        self.heatmap = heatmap
+        self.heatmapCache = None
+        # Com gbuffer, a renderização guarda o primeiro acerto de cada amostra e uma
+        # mudança só nas luzes ou sombras refaz apenas a iluminação. Só vale sem
+        # rebatimentos, então cenas como a sala de aula (debounces=5) continuam
+        # renderizando tudo ao ligar uma luz, e o console avisa quando isso acontece. Fica
+        # desligado por padrão porque guarda cada amostra: no main.py (800x450, 64
+        # amostras) seriam mais de 1 GB
+        self.gbuffer = gbuffer
+        self.gbufferScene = None
+        self.gbufferSamples = 0
+        self.relighting = False
+        # Retângulos da tela (x0, y0, x1, y1) que mudaram desde a última renderização
+        # completa; None faz a próxima renderização redesenhar tudo
+        self.dirty: list[tuple[int, int, int, int]] = None
+        self.region: list[tuple[int, int, int, int]] = None
+        self.complete = False
+        self.lighting = None
+        self.passes = 0
+        self.spent = 0
+        self.stopped = False
+        # Amostras feitas por este processo; nos processos de renderização é a posição dele em shared_progress
+        self.progress = np.zeros(1, dtype=np.int64)
 
         dirXZ = self.direction[[0, 2]]
         if all(dirXZ == np.array([0., 0.])):
@@ -47,90 +102,617 @@ class Camera():
             self.up = transforms.rotate(self.up, np.radians(rotation), self.direction)
             self.right = transforms.rotate(self.right, np.radians(rotation), self.direction)
 
-        self.pixelPositions = calcuate_pixels(self.frameOrigin, self.up, self.right, *self.resolution, self.pixel_width, self.pixel_height)
-        # self.rayDirections = calcuate_directions(self.position, self.pixelPositions, *self.resolution)
 
-    def shared_array_to_numpy_array(self, shared_array):
-        return np.ctypeslib.as_array(shared_array).reshape((*self.resolution[::-1], 3))
-
-    def init_worker(self, shared_buffer, shared_progress):
-        global buffer
-        global progress
-        buffer = self.shared_array_to_numpy_array(shared_buffer)
-        progress = np.ctypeslib.as_array(shared_progress).reshape(1)
-
-    def getRay(self, x, y):
-        random_x, random_y = (np.random.random(2) - 0.5) * np.array([self.pixel_width, self.pixel_height])
-        random_pixel_pos = self.pixelPositions[x, y] + self.right * random_x + self.up * random_y
+    def __getstate__(self):
+        # O buffer e o progresso são acessados pelos processos via memória compartilhada
+        state = self.__dict__.copy()
+        for key in ('scene', 'buffer', 'display', 'accumulation', 'squares', 'sampleCounts', 'passCounts', 'costs', 'progress', 'shared_progress', 'scheduler', 'checkpoint', 'gbufferScene', 'objectIds', 'hitPoints', 'gPoints', 'gNormals', 'gAlbedo', 'gPrims', 'heatmapCache'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.scene = None
+
+    def getRay(self, x, y, sample=None):
+        # Sem o índice da amostra o raio passa pelo centro do pixel
+        random_x, random_y = 0., 0.
+        if sample is not None:
+            pixel = np.array([y * self.resolution[0] + x])
+            random_x, random_y = (self.sampler.get2D(pixel, np.array([sample]), 0)[0] - 0.5) * np.array([self.pixel_width, self.pixel_height])
+        random_pixel_pos = self.getPixelPositions(np.array([x]), np.array([y]))[0] + self.right * random_x + self.up * random_y
         if self.perpendicular:
             return Ray(random_pixel_pos, self.direction)
 
         random_direction = transforms.normalize(random_pixel_pos - self.position)
         return Ray(self.position, random_direction)
 
-    def threadedRayCast(self, x0, y, batch):
-        samples_buffer = np.zeros((self.n_samples, 3), dtype=np.float64)
-        for obj in self.scene.objects:
-            obj.preCalc()
-
-        width, _ = self.resolution
-        for x in range(x0, min(x0 + batch, width)):
-            for sample in range(self.n_samples):
-                ray = self.getRay(x, y)
-                target, lightness = self.calcRecursiveRayCast(ray, self.debounces, 1)
-
-                if target is None:
-                    if self.scene.cubemap is None:
-                        lightness = SKY_COLOR
-                    else:
-                        lightness = self.scene.cubemap.getColor(ray.direction)
+    def getSamples(self, x0, y0, x1, y1) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Um raio por amostra, com o índice da amostra contado desde o primeiro passo
+        counts = self.getPassCounts(x0, y0, x1, y1)
+        ys, xs = np.mgrid[y0:y1, x0:x1].reshape(2, -1)
+        first = self.sampleCounts[y0:y1, x0:x1].ravel() if self.accumulating else np.zeros(len(counts), dtype=np.int64)
+        starts = np.cumsum(counts) - counts
+        samples = np.arange(counts.sum()) - np.repeat(starts - first, counts)
+        return np.repeat(xs, counts), np.repeat(ys, counts), samples, counts
+
+    def getPixelPositions(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        # Centros dos pixels no plano da imagem, calculados só para os pixels pedidos
+        return pixel_positions(self.frameOrigin, self.up, self.right, xs, ys, *self.resolution, self.pixel_width, self.pixel_height)
+
+    def getRays(self, xs: np.ndarray, ys: np.ndarray, samples: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        pixels = self.getPixelPositions(xs, ys)
+        jitter = self.sampler.get2D(ys * self.resolution[0] + xs, samples, 0)
+        random_xy = (jitter - 0.5) * np.array([self.pixel_width, self.pixel_height])
+        random_pixel_pos = pixels + random_xy[:, :1] * self.right + random_xy[:, 1:] * self.up
+        if self.perpendicular:
+            return random_pixel_pos, np.tile(self.direction, (len(pixels), 1))
+
+        directions = random_pixel_pos - self.position
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        return np.tile(self.position, (len(pixels), 1)), directions
+
+    @property
+    def usesGBuffer(self):
+        # Com rebatimentos a luz indireta também depende das luzes, então o G-buffer não
+        # basta e a troca de luzes na sala de aula fica fora do alcance do reacendimento
+        return self.gbuffer and self.debounces == 0
+
+    def getRelightFallback(self, scene) -> str|None:
+        # Por que uma mudança nas luzes ou sombras precisa de uma renderização completa
+        if not self.gbuffer:
+            return 'o G-buffer está desligado (gbuffer=False)'
+        if self.debounces > 0:
+            return f'com {self.debounces} rebatimentos a luz indireta também depende das luzes'
+        if self.gbufferScene is None or self.gbufferScene is not scene.compiled:
+            return 'ainda não há um G-buffer completo desta cena'
+        return None
+
+    def canRelight(self, scene) -> bool:
+        return self.getRelightFallback(scene) is None
+
+    @property
+    def accumulating(self):
+        return self.progressive or self.adaptive
+
+    @property
+    def pixelCount(self) -> int:
+        if self.region is None:
+            return int(self.resolution[0] * self.resolution[1])
+        return sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in self.region)
+
+    @property
+    def budget(self):
+        if self.sample_budget is not None:
+            return self.sample_budget
+        return self.pixelCount * self.n_samples
+
+    def getProgress(self) -> float:
+        return min((self.spent + self.shared_progress.sum()) / self.budget, 1.)
+
+    def stop(self):
+        self.stopped = True
+
+    def getPassCounts(self, x0, y0, x1, y1) -> np.ndarray:
+        if self.adaptive:
+            return self.passCounts[y0:y1, x0:x1].ravel()
+        return np.full((y1 - y0) * (x1 - x0), 1 if self.progressive else self.n_samples)
+
+    def planPass(self) -> int:
+        pixels = self.pixelCount
+        if not self.adaptive:
+            n_passes = self.n_samples if self.progressive else 1
+            if self.passes >= n_passes: return 0
+            return pixels * (1 if self.progressive else self.n_samples)
+
+        if self.passes == 0:
+            # O primeiro passo é uniforme, mesmo que o orçamento não cubra min_samples por pixel
+            error = np.zeros(self.sampleCounts.shape)
+            counts = np.full(self.sampleCounts.shape, max(min(self.min_samples, self.max_samples, self.budget // pixels), 1))
+        else:
+            # Meia largura do intervalo de confiança da média, no canal mais ruidoso
+            n = self.sampleCounts[..., None].astype(np.float64)
+            mean = self.accumulation / n
+            variance = np.maximum(self.squares / n - mean ** 2, 0.) * n / np.maximum(n - 1., 1.)
+            error = CONFIDENCE_Z * np.sqrt((variance / n).max(axis=2))
+            error[self.sampleCounts < 2] = np.inf
+            active = (error > self.adaptive_threshold) & (self.sampleCounts < self.max_samples)
+            counts = np.where(active, np.minimum(self.sampleCounts, self.max_samples - self.sampleCounts), 0)
+
+        # Se o orçamento não cobre o passo inteiro, os pixels mais ruidosos vêm primeiro
+        remaining = self.budget - self.spent
+        if counts.sum() > remaining:
+            order = np.argsort(-error.ravel(), kind='stable')
+            flat = counts.reshape(-1)
+            flat[order[np.cumsum(flat[order]) > remaining]] = 0
+
+        self.passCounts[:] = counts
+        return int(counts.sum())
+
+    def project(self, points: np.ndarray) -> np.ndarray|None:
+        # Coordenadas (x, y) em pixels de pontos do mundo; None se algum está atrás da câmera
+        offsets = points - self.position
+        depths = offsets @ self.direction
+        if self.perpendicular:
+            offsets = offsets - depths[:, None] * self.direction
+        elif (depths <= 1e-9).any():
+            return None
+        else:
+            offsets = offsets * (self.distance / depths)[:, None]
+
+        pixels = np.stack([offsets @ self.right / self.pixel_width, offsets @ self.up / self.pixel_height], axis=1)
+        return pixels + self.resolution / 2 - 0.5
+
+    def markDirty(self, points: np.ndarray = None):
+        # Com rebatimentos a mudança aparece em reflexos por toda a imagem; a amostragem
+        # adaptativa e os checkpoints dependem da imagem inteira
+        pixels = None if points is None else self.project(points)
+        if pixels is None or self.debounces > 0 or self.adaptive or self.checkpoint is not None:
+            self.complete = False
+            return
+
+        # Um pixel de folga para o jitter das amostras
+        x0, y0 = np.maximum(np.floor(pixels.min(axis=0)).astype(int) - 1, 0).tolist()
+        x1, y1 = np.minimum(np.ceil(pixels.max(axis=0)).astype(int) + 2, self.resolution).tolist()
+        self.dirty = (self.dirty or []) + ([(x0, y0, x1, y1)] if x0 < x1 and y0 < y1 else [])
+
+    def getDirtyTiles(self, scene, tiles: list[tuple[int, int, int, int]]) -> list[tuple[int, int, int, int]]|None:
+        dirty, self.dirty = self.dirty, None
+        if dirty is None or not self.complete or self.lighting != scene.getLighting():
+            return None
+
+        return [
+            (x0, y0, x1, y1) for x0, y0, x1, y1 in tiles
+            if any(x0 < dx1 and dx0 < x1 and y0 < dy1 and dy0 < y1 for dx0, dy0, dx1, dy1 in dirty)
+        ]
+
+    def storeHits(self, xs: np.ndarray, ys: np.ndarray, prims: np.ndarray, points: np.ndarray):
+        # A primeira amostra de cada pixel nesta renderização define o objeto e o ponto usados
+        # pela janela; depois de retomar um checkpoint nenhum passo começa da amostra 0
+        first = np.ones(len(xs), dtype=bool)
+        first[1:] = (xs[1:] != xs[:-1]) | (ys[1:] != ys[:-1])
+        first &= self.objectIds[ys, xs] == -1
+        prims = prims[first]
+        self.objectIds[ys[first], xs[first]] = np.where(prims >= 0, self.scene.compiled.objectIds[prims], -1)
+        self.hitPoints[ys[first], xs[first]] = points[first]
+
+    def getHit(self, x, y) -> tuple[int, np.ndarray]:
+        return int(self.objectIds[y, x]), self.hitPoints[y, x]
+
+    def store(self, x0, y0, x1, y1, colors: np.ndarray, counts: np.ndarray, sampleCosts: np.ndarray = None):
+        shape = (y1 - y0, x1 - x0)
+        pixels = np.repeat(np.arange(len(counts)), counts)
+        if sampleCosts is not None:
+            self.costs[y0:y1, x0:x1] += np.bincount(pixels, sampleCosts, minlength=len(counts)).reshape(shape)
+        sums = np.stack([np.bincount(pixels, colors[:, c], minlength=len(counts)) for c in range(3)], axis=1)
+        if not self.accumulating:
+            self.buffer[y0:y1, x0:x1] = (sums / counts[:, None]).reshape(*shape, 3)
+            self.display[y0:y1, x0:x1] = self.buffer[y0:y1, x0:x1]
+            return
+
+        # Cada passo soma suas amostras e o buffer exibido é a média até aqui
+        self.accumulation[y0:y1, x0:x1] += sums.reshape(*shape, 3)
+        self.sampleCounts[y0:y1, x0:x1] += counts.reshape(shape)
+        if self.adaptive:
+            self.squares[y0:y1, x0:x1] += np.stack([np.bincount(pixels, colors[:, c] ** 2, minlength=len(counts)) for c in range(3)], axis=1).reshape(*shape, 3)
+        self.buffer[y0:y1, x0:x1] = self.accumulation[y0:y1, x0:x1] / np.maximum(self.sampleCounts[y0:y1, x0:x1], 1)[..., None]
+        self.display[y0:y1, x0:x1] = self.buffer[y0:y1, x0:x1]
+
+    def getHeatmap(self) -> tuple[np.ndarray, float]:
+        # A imagem só é refeita quando algum tile terminou desde a última chamada
+        key = (self.passes, self.spent, int(self.shared_progress.sum()))
+        if self.heatmapCache is None or self.heatmapCache[0] != key:
+            self.heatmapCache = (key, *self.computeHeatmap())
+        return self.heatmapCache[1:]
+
+    def computeHeatmap(self) -> tuple[np.ndarray, float]:
+        # Trabalho médio por amostra (nós da BVH + testes de interseção) em cores falsas,
+        # saturando no percentil 99 para que poucos pixels não achatem a escala
+        samples = np.maximum(self.sampleCounts, 1) if self.accumulating else self.n_samples
+        work = self.costs / samples
+        scale = max(float(np.percentile(work, 99)), 1.)
+        levels = np.clip(work / scale * 255., 0., 255.).astype(np.uint8)
+        return np.ascontiguousarray(cv2.applyColorMap(levels, cv2.COLORMAP_INFERNO)[..., ::-1]), scale
+
+    def getFootprints(self, travelled: np.ndarray, directions: np.ndarray, normals: np.ndarray) -> np.ndarray:
+        # Largura do pixel projetada na superfície, usada para escolher o nível do mipmap;
+        # também aceita um único acerto, como no modo recursivo
+        width = max(self.pixel_width, self.pixel_height)
+        if not self.perpendicular:
+            width = travelled * width / self.distance
+
+        cos = np.abs(np.sum(directions * normals, axis=-1))
+        return width / np.maximum(cos, 0.1)
+
+    def renderTask(self, x0, y0, x1, y1):
+        # Com semente, cada tile de cada passo tem sua própria sequência aleatória,
+        # então a imagem não depende de qual processo renderizou o tile
+        if self.seed is not None:
+            np.random.seed((self.seed, self.passes, x0, y0))
+        stats.track(self.heatmap)
+
+        if self.usesGBuffer:
+            self.gbufferRayCast(x0, y0, x1, y1)
+        elif self.mode == 'wavefront':
+            self.wavefrontRayCast(x0, y0, x1, y1)
+        elif self.mode == 'pathtracing':
+            self.pathTraceRayCast(x0, y0, x1, y1)
+        else:
+            self.threadedRayCast(x0, y0, x1, y1)
+
+    def threadedRayCast(self, x0, y0, x1, y1):
+        xs, ys, samples, counts = self.getSamples(x0, y0, x1, y1)
+        origins, directions = self.getRays(xs, ys, samples)
+        colors = np.zeros((len(origins), 3), dtype=self.dtype)
+        sampleCosts = np.zeros(len(origins)) if self.heatmap else None
+        ts, prims, points = self.scene.traceBatch(origins, directions, work=sampleCosts)
+        self.storeHits(xs, ys, prims, points)
+        pixels = ys * self.resolution[0] + xs
+        uvs = np.empty((len(origins), self.debounces, 2))
+        for depth in range(1, self.debounces + 1):
+            uvs[:, depth - 1] = self.sampler.get2D(pixels, samples, depth)
+        for k in range(len(origins)):
+            before = stats.work()
+            ray = Ray(origins[k], directions[k], ts[k])
+            hit = (points[k], self.scene.getPrimitive(prims[k]))
+            target, lightness = self.calcRecursiveRayCast(ray, self.debounces, 1, hit, uvs[k])
+
+            if target is None:
+                if self.scene.cubemap is None:
+                    lightness = SKY_COLOR
+                else:
+                    lightness = self.scene.cubemap.getColor(ray.direction)
+
+            sample_color = np.clip(lightness, 0., 255.)
+            if self.gamma_correction:
+                sample_color = gamma_correction(sample_color)
+
+            colors[k] = sample_color
+            self.progress[0] += 1
+            if sampleCosts is not None:
+                sampleCosts[k] += stats.work() - before
+
+        self.store(x0, y0, x1, y1, colors, counts, sampleCosts)
+
+    def wavefrontRayCast(self, x0, y0, x1, y1):
+        xs, ys, samples, counts = self.getSamples(x0, y0, x1, y1)
+        origins, directions = self.getRays(xs, ys, samples)
+        pixels = ys * self.resolution[0] + xs
+        colors = np.zeros((len(origins), 3), dtype=self.dtype)
+        throughput = np.ones(len(origins), dtype=self.dtype)
+        travelled = np.zeros(len(origins))
+        paths = np.arange(len(origins))
+        compiled = self.scene.compiled
+        sampleCosts = np.zeros(len(origins)) if self.heatmap else None
+
+        for depth in range(1, self.debounces + 2):
+            work = None if sampleCosts is None else np.zeros(len(paths))
+            ts, prims, points = self.scene.traceBatch(origins, directions, kind='primary' if depth == 1 else 'bounce', work=work)
+            if sampleCosts is not None:
+                sampleCosts[paths] += work
+            alive = prims >= 0
+            if depth == 1:
+                self.storeHits(xs, ys, prims, points)
+                colors[~alive] = self.scene.getBackground(directions[~alive])
+            else:
+                alive &= np.random.random(len(paths)) >= 0.5
+
+            paths, prims, points = paths[alive], prims[alive], points[alive]
+            directions, throughput = directions[alive], throughput[alive]
+            travelled = travelled[alive] + ts[alive]
+            if len(paths) == 0:
+                break
+
+            normals = compiled.getNormals(prims, points)
+            footprints = self.getFootprints(travelled, directions, normals)
+            work = None if sampleCosts is None else np.zeros(len(paths))
+            colors[paths] += throughput[:, None] * self.scene.computeLightnessBatch(points, normals, directions, prims, footprints, work, self.dtype)
+            if sampleCosts is not None:
+                sampleCosts[paths] += work
+            if depth > self.debounces:
+                break
+
+            # Agrupa os caminhos por material para espalhar cada grupo de uma vez
+            weights = np.zeros(len(paths), dtype=self.dtype)
+            uv = self.sampler.get2D(pixels[paths], samples[paths], depth)
+            materialIds = compiled.materialIds[prims]
+            for materialId in np.unique(materialIds):
+                group = materialIds == materialId
+                directions[group], weights[group] = compiled.materials[materialId].scatterBatch(directions[group], points[group], normals[group], uv[group])
+
+            alive = weights > 0
+            paths, origins, directions = paths[alive], points[alive], directions[alive]
+            throughput, travelled = throughput[alive] * weights[alive], travelled[alive]
+
+        sample_colors = np.clip(colors, 0., 255.)
+        if self.gamma_correction:
+            sample_colors = gamma_correction(sample_colors)
+
+        self.store(x0, y0, x1, y1, sample_colors, counts, sampleCosts)
+        self.progress[0] += len(pixels)
+
+    def pathTraceRayCast(self, x0, y0, x1, y1):
+        xs, ys, samples, counts = self.getSamples(x0, y0, x1, y1)
+        origins, directions = self.getRays(xs, ys, samples)
+        pixels = ys * self.resolution[0] + xs
+        colors = np.zeros((len(origins), 3), dtype=self.dtype)
+        throughput = np.ones((len(origins), 3), dtype=self.dtype)
+        travelled = np.zeros(len(origins))
+        paths = np.arange(len(origins))
+        compiled = self.scene.compiled
+        sampleCosts = np.zeros(len(origins)) if self.heatmap else None
+
+        for depth in range(1, self.debounces + 2):
+            work = None if sampleCosts is None else np.zeros(len(paths))
+            ts, prims, points = self.scene.traceBatch(origins, directions, kind='primary' if depth == 1 else 'bounce', work=work)
+            if sampleCosts is not None:
+                sampleCosts[paths] += work
+
+            if depth == 1:
+                self.storeHits(xs, ys, prims, points)
+
+            # Raios que escapam da cena recebem a luz do céu ou do cubemap
+            missed = prims < 0
+            colors[paths[missed]] += throughput[missed] * self.scene.getBackground(directions[missed])
+
+            hit = ~missed
+            paths, prims, points = paths[hit], prims[hit], points[hit]
+            directions, throughput = directions[hit], throughput[hit]
+            travelled = travelled[hit] + ts[hit]
+            if len(paths) == 0:
+                break
+
+            # A normal de sombreamento fica do lado de onde o raio veio
+            normals = compiled.getNormals(prims, points)
+            normals[np.einsum('ij,ij->i', directions, normals) > 0] *= -1
+            albedo = compiled.getColors(prims, points, self.getFootprints(travelled, directions, normals), self.dtype)
+            work = None if sampleCosts is None else np.zeros(len(paths))
+            # A luz ambiente faz o papel da luz indireta que o caminho não vai buscar, então só
+            # entra no último vértice; antes dele o rebatimento já traz o céu e as outras superfícies
+            ambient = depth > self.debounces
+            colors[paths] += throughput * albedo * self.scene.sampleLightsBatch(points, normals, directions, prims, work, ambient, self.dtype)
+            if sampleCosts is not None:
+                sampleCosts[paths] += work
+            if depth > self.debounces:
+                break
+
+            weights = np.zeros((len(paths), 3), dtype=self.dtype)
+            uv = self.sampler.get2D(pixels[paths], samples[paths], depth)
+            materialIds = compiled.materialIds[prims]
+            for materialId in np.unique(materialIds):
+                group = materialIds == materialId
+                directions[group], weights[group] = compiled.materials[materialId].sampleBatch(directions[group], normals[group], albedo[group] / 255., uv[group])
+            throughput = throughput * weights
+
+            # Roleta russa: caminhos que sobrevivem são reponderados para manter a estimativa sem viés
+            alive = throughput.max(axis=1) > 0
+            if depth >= ROULETTE_DEPTH:
+                survival = np.minimum(throughput.max(axis=1), 0.95)
+                alive &= np.random.random(len(paths)) < survival
+                throughput[alive] /= survival[alive, None]
+
+            paths, origins, directions = paths[alive], points[alive], directions[alive]
+            throughput, travelled = throughput[alive], travelled[alive]
+
+        sample_colors = np.clip(colors, 0., 255.)
+        if self.gamma_correction:
+            sample_colors = gamma_correction(sample_colors)
+
+        self.store(x0, y0, x1, y1, sample_colors, counts, sampleCosts)
+        self.progress[0] += len(pixels)
+
+    def gbufferRayCast(self, x0, y0, x1, y1):
+        # Iluminação direta em duas etapas: o primeiro acerto de cada amostra vai para o
+        # G-buffer e a iluminação é sempre calculada a partir dele, então reacender as
+        # luzes dá exatamente a imagem que uma renderização completa daria
+        if self.relighting:
+            ys, xs, samples = np.mgrid[y0:y1, x0:x1, :self.gbufferSamples].reshape(3, -1)
+            counts = np.full((y1 - y0) * (x1 - x0), self.gbufferSamples)
+            sampleCosts = np.zeros(len(xs)) if self.heatmap else None
+        else:
+            xs, ys, samples, counts = self.getSamples(x0, y0, x1, y1)
+            origins, directions = self.getRays(xs, ys, samples)
+            sampleCosts = np.zeros(len(xs)) if self.heatmap else None
+            ts, prims, points = self.scene.traceBatch(origins, directions, work=sampleCosts)
+            self.storeHits(xs, ys, prims, points)
+            compiled = self.scene.compiled
+            hit = prims >= 0
+            normals = np.zeros((len(xs), 3))
+            normals[hit] = compiled.getNormals(prims[hit], points[hit])
+            if self.mode == 'pathtracing':
+                normals[np.einsum('ij,ij->i', directions, normals) > 0] *= -1
+            albedo = np.empty((len(xs), 3), dtype=self.dtype)
+            albedo[~hit] = self.scene.getBackground(directions[~hit])
+            albedo[hit] = compiled.getColors(prims[hit], points[hit], self.getFootprints(ts[hit], directions[hit], normals[hit]))
+            self.gPoints[ys, xs, samples] = points
+            self.gNormals[ys, xs, samples] = normals
+            self.gAlbedo[ys, xs, samples] = albedo
+            self.gPrims[ys, xs, samples] = prims
+
+        prims = self.gPrims[ys, xs, samples]
+        hit = prims >= 0
+        points = self.gPoints[ys, xs, samples][hit]
+        normals = self.gNormals[ys, xs, samples][hit].astype(np.float64)
+        if self.perpendicular:
+            directions = np.tile(self.direction, (len(points), 1))
+        else:
+            directions = points - self.position
+            directions /= np.linalg.norm(directions, axis=1)[:, None]
 
-                sample_color = np.clip(lightness, 0., 255.)
-                if self.gamma_correction:
-                    sample_color = gamma_correction(sample_color)
+        lightness = np.ones((len(prims), 3), dtype=self.dtype)
+        work = None if sampleCosts is None else np.zeros(len(points))
+        if self.mode == 'pathtracing':
+            lightness[hit] = self.scene.sampleLightsBatch(points, normals, directions, prims[hit], work, dtype=self.dtype)
+        else:
+            lightness[hit] = self.scene.computeLightsBatch(points, normals, directions, prims[hit], work, self.dtype)
+        if sampleCosts is not None:
+            sampleCosts[hit] += work
 
-                samples_buffer[sample] = sample_color
+        sample_colors = np.clip(self.gAlbedo[ys, xs, samples] * lightness, 0., 255.)
+        if self.gamma_correction:
+            sample_colors = gamma_correction(sample_colors)
 
-            buffer[y, x] = np.mean(samples_buffer, axis=0)
-            progress[0] += 1
+        self.store(x0, y0, x1, y1, sample_colors, counts, sampleCosts)
+        self.progress[0] += len(xs)
 
-    def calcRecursiveRayCast(self, ray: Ray, debounces=0, depth=1) -> tuple[Object, np.ndarray]:
+    def calcRecursiveRayCast(self, ray: Ray, debounces=0, depth=1, hit: tuple[np.ndarray, Object] = None, uvs: np.ndarray = None, travelled=0.) -> tuple[Object, np.ndarray]:
         weight = 0.5 ** depth
-        point, target = self.scene.rayTrace(ray)
+        point, target = self.scene.rayTrace(ray) if hit is None else hit
         if target is None or (weight < 0.5 and np.random.random() < 0.5):
             return None, None
 
         normal = target.getNormal(point)
-        lightness = self.scene.computeLightness(point, normal, ray, target)
+        travelled += ray.t
+        footprint = self.getFootprints(travelled, ray.direction, normal)
+        lightness = self.scene.computeLightness(point, normal, ray, target, footprint)
         if debounces > 0:
-            scattered_ray, weight = target.material.scatter(ray, point, normal)
+            uv = None if uvs is None else uvs[depth - 1]
+            scattered_ray, weight = target.material.scatter(ray, point, normal, uv)
             if scattered_ray is not None:
-                _, scattered_color = self.calcRecursiveRayCast(scattered_ray, debounces - 1, depth+1)
+                _, scattered_color = self.calcRecursiveRayCast(scattered_ray, debounces - 1, depth+1, uvs=uvs, travelled=travelled)
                 if scattered_color is not None:
                     lightness += scattered_color * weight
 
         return target, lightness
 
     def rayCast(self, scene=None):
-        arraySize = self.resolution[0] * self.resolution[1] * 3
-
-        shared_buffer = mp.Array(ctypes.c_float, int(arraySize), lock=False)
-        shared_progress = mp.Array(ctypes.c_int, 1, lock=False)
-        self.buffer = self.shared_array_to_numpy_array(shared_buffer)
-        self.shared_progress = np.ctypeslib.as_array(shared_progress).reshape(1)
-        self.shared_progress[0] = 0
-        if scene is not None:
-            scene.image = self.buffer
         self.scene = scene
-
-        width, height = self.resolution
-        batch = 64
-        pixels = ((x0, height-y-1) for y in range(height) for x0 in range(0, width, batch))
-        args = (pixel + (batch,) for pixel in pixels)
-
-        pool = mp.Pool(processes=self.n_threads, initializer=self.init_worker, initargs=(shared_buffer, shared_progress))
-
-        pool.starmap(self.threadedRayCast, args)
+        if scene.compiled is None:
+            scene.compile()
+
+        renderer = scene.getRenderer(self.n_threads)
+        renderer.resetStats()
+        shape = (*self.resolution[::-1], 3)
+        self.buffer = renderer.getBuffer('buffer', shape, self.dtype)
+        self.display = renderer.getBuffer('display', shape, np.uint8)
+        self.objectIds = renderer.getBuffer('objectIds', shape[:2], np.int32)
+        # Em float64 mesmo com precision='float32': o ponto escolhido vai para o preCalc via ctypes como double
+        self.hitPoints = renderer.getBuffer('hitPoints', shape, np.float64)
+
+        # Reacender não muda o que cada pixel enxerga, então os ids e pontos continuam valendo
+        relighting = self.canRelight(scene)
+        cleared = [(self.buffer, 0), (self.display, 0)] + ([] if relighting else [(self.objectIds, -1), (self.hitPoints, np.nan)])
+        if self.accumulating:
+            self.accumulation = renderer.getBuffer('accumulation', shape, self.dtype)
+            self.sampleCounts = renderer.getBuffer('sampleCounts', shape[:2], np.int32)
+            cleared += [(self.accumulation, 0), (self.sampleCounts, 0)]
+        if self.adaptive:
+            self.squares = renderer.getBuffer('squares', shape, self.dtype)
+            self.passCounts = renderer.getBuffer('passCounts', shape[:2], np.int32)
+            cleared.append((self.squares, 0))
+        if self.heatmap:
+            self.costs = renderer.getBuffer('costs', shape[:2], np.float64)
+            cleared.append((self.costs, 0))
+        self.shared_progress = renderer.progress
+        scene.image = self.display
+        self.heatmapCache = None
+
+        # Depois de mover um objeto só os tiles da região suja são refeitos
+        tiles = self.scheduler.schedule(self)
+        self.region = self.getDirtyTiles(scene, tiles)
+        for array, value in cleared:
+            if self.region is None:
+                array[:] = value
+            for x0, y0, x1, y1 in self.region or []:
+                array[y0:y1, x0:x1] = value
+        if self.region is not None:
+            tiles = self.region
+        self.lighting = scene.getLighting()
+        if self.usesGBuffer:
+            # Uma entrada por amostra; os pontos ficam em float64 como em hitPoints, já que
+            # são a origem dos raios de sombra, e o resto segue a precisão da câmera
+            samples = (*shape[:2], self.n_samples)
+            self.gPoints = renderer.getBuffer('gPoints', (*samples, 3), np.float64)
+            self.gNormals = renderer.getBuffer('gNormals', (*samples, 3), self.dtype)
+            self.gAlbedo = renderer.getBuffer('gAlbedo', (*samples, 3), self.dtype)
+            self.gPrims = renderer.getBuffer('gPrims', samples, np.int32)
+            if relighting:
+                self.relight(renderer, tiles)
+                return
+            self.gbufferScene = None
+
+        self.passes, self.spent, self.stopped, self.complete = 0, 0, False, False
+        if self.checkpoint is not None:
+            self.resume()
+
+        saved = time.time()
+        while not self.stopped and not renderer.closed:
+            n_samples = self.planPass()
+            if n_samples == 0:
+                self.complete = True
+                break
+
+            tasks = tiles
+            if self.adaptive:
+                tasks = [(x0, y0, x1, y1) for x0, y0, x1, y1 in tiles if self.passCounts[y0:y1, x0:x1].any()]
+
+            self.passes += 1
+            self.scheduler.record(renderer.render(scene, self, tasks))
+            self.spent += n_samples
+            if self.checkpoint is not None and time.time() - saved >= self.checkpoint_interval:
+                self.saveCheckpoint()
+                saved = time.time()
+
+        # Depois de um stop o passo atual terminou, então o que foi acumulado é salvo
+        # mesmo que o renderizador já tenha sido fechado
+        if self.checkpoint is not None and (self.stopped or not renderer.closed):
+            self.saveCheckpoint()
+        # Uma renderização parcial vem de uma cena recompilada, e a BVH nova pode renumerar
+        # as primitivas que os tiles fora da região ainda guardam no G-buffer
+        if self.usesGBuffer and self.passes > 0 and self.region is None and not renderer.closed:
+            self.gbufferScene = scene.compiled
+            self.gbufferSamples = self.passes if self.progressive else self.n_samples
+
+    def relight(self, renderer, tiles: list[tuple[int, int, int, int]]):
+        # Mesmas amostras, só a iluminação muda: um único passo sobre o G-buffer
+        self.passes, self.spent, self.stopped = 1, 0, False
+        self.relighting = True
+        try:
+            renderer.render(self.scene, self, tiles)
+        finally:
+            self.relighting = False
+        self.spent = self.budget
+
+    def getFingerprint(self) -> dict:
+        # O que precisa ser igual para que as amostras salvas continuem valendo
+        return {
+            'resolution': self.resolution.tolist(),
+            'position': np.asarray(self.position).tolist(),
+            'at': np.asarray(self.at).tolist(),
+            'rotation': self.rotation,
+            'distance': self.distance,
+            'perpendicular': self.perpendicular,
+            'mode': self.mode,
+            'debounces': self.debounces,
+            'gamma_correction': self.gamma_correction,
+            'adaptive': self.adaptive,
+            'sampler': type(self.sampler).__name__,
+            'scene': self.scene.getDigest(),
+            'lighting': self.scene.getLighting(),
+        }
+
+    def getCheckpointBuffers(self) -> dict[str, np.ndarray]:
+        buffers = {'accumulation': self.accumulation, 'sampleCounts': self.sampleCounts}
+        if self.adaptive:
+            buffers['squares'] = self.squares
+        return buffers
+
+    def saveCheckpoint(self):
+        self.checkpoint.save(self.getFingerprint(), self.getCheckpointBuffers(), passes=self.passes, seed=self.seed)
+
+    def resume(self):
+        state = self.checkpoint.load(self.getFingerprint(), self.getCheckpointBuffers())
+        if state is None:
+            return
+
+        # Com a mesma semente e o número de passos, os próximos passos continuam a
+        # sequência aleatória em vez de repetir amostras já acumuladas
+        self.passes = state['passes']
+        self.seed = self.sampler.seed = state['seed']
+        self.spent = int(self.sampleCounts.sum())
+        self.buffer[:] = self.accumulation / np.maximum(self.sampleCounts, 1)[..., None]
+        self.display[:] = self.buffer
+        print(f'Retomando de {self.checkpoint.path}: passo {self.passes}, {self.spent / self.sampleCounts.size:.1f} amostras por pixel')
 
 
 @numba.jit
@@ -143,22 +725,12 @@ def gamma_correction(color: np.ndarray):
 
 
 @numba.jit
-def calcuate_pixels(frameOrigin, viewUp, viewRight, width, height, pixel_width, pixel_height):
-    points = np.zeros((width, height, 3))
+def pixel_positions(frameOrigin, viewUp, viewRight, xs, ys, width, height, pixel_width, pixel_height):
+    points = np.zeros((len(xs), 3))
 
-    for x, y in np.ndindex((width, height)):
-        dx = (x - width/2) * pixel_width + pixel_width/2
-        dy = (y - height/2) * pixel_height + pixel_height/2
-        points[x, y] = frameOrigin + dy*viewUp + dx*viewRight
+    for i in range(len(xs)):
+        dx = (xs[i] - width/2) * pixel_width + pixel_width/2
+        dy = (ys[i] - height/2) * pixel_height + pixel_height/2
+        points[i] = frameOrigin + dy*viewUp + dx*viewRight
 
     return points
-
-
-# @numba.jit
-# def calcuate_directions(eye, pixels, width, height):
-#     directions = np.zeros((width, height, 3))
-#     for x, y in np.ndindex((width, height)):
-#         direction = pixels[x, y] - eye
-#         directions[x, y] = direction/np.linalg.norm(direction)
-
-#     return directions
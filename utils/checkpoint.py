@@ -0,0 +1,54 @@
+import os
+import json
+import numpy as np
+
+
+class Checkpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self.slot = None
+        self.maps: dict[tuple[str, int], np.memmap] = {}
+
+    @property
+    def statePath(self) -> str:
+        return os.path.join(self.path, 'state.json')
+
+    def getFile(self, key: str, slot: int) -> str:
+        return os.path.join(self.path, f'{key}.{slot}.npy')
+
+    def load(self, fingerprint: dict, buffers: dict[str, np.ndarray]) -> dict:
+        if not os.path.exists(self.statePath):
+            return None
+
+        with open(self.statePath) as file:
+            state = json.load(file)
+        if state['fingerprint'] != json.loads(json.dumps(fingerprint)):
+            # A cena mudou desde o último checkpoint: a renderização começa do zero e o
+            # próximo save sobrescreve o checkpoint antigo
+            print(f'O checkpoint em {self.path} é de outra cena, câmera ou resolução; começando do zero')
+            return None
+
+        for key, buffer in buffers.items():
+            buffer[:] = np.load(self.getFile(key, state['slot']), mmap_mode='r')
+
+        self.slot = state['slot']
+        return state
+
+    def save(self, fingerprint: dict, buffers: dict[str, np.ndarray], **state):
+        # Dois conjuntos de arquivos se alternam: o estado só aponta para o novo
+        # depois que ele foi gravado, então uma falha no meio mantém o anterior
+        os.makedirs(self.path, exist_ok=True)
+        slot = 1 if self.slot == 0 else 0
+        for key, buffer in buffers.items():
+            data = self.maps.get((key, slot))
+            if data is None or data.shape != buffer.shape or data.dtype != buffer.dtype:
+                data = np.lib.format.open_memmap(self.getFile(key, slot), mode='w+', dtype=buffer.dtype, shape=buffer.shape)
+                self.maps[(key, slot)] = data
+            data[:] = buffer
+            data.flush()
+
+        temporary = self.statePath + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({**state, 'fingerprint': fingerprint, 'slot': slot}, file)
+        os.replace(temporary, self.statePath)
+        self.slot = slot
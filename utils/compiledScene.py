@@ -0,0 +1,203 @@
+import time
+import hashlib
+import numpy as np
+from utils import kernels, transforms, shared, stats
+from objects.bvh import AABBTree
+from utils.material import Material
+from objects import Object, Sphere, Plane, Triangle, Circle, Cone, Cylinder
+
+
+SHARED_ARRAYS = (
+    'spheres', 'planes', 'triangles', 'circles', 'cones', 'cylinders', 'nodes',
+    'kinds', 'indices', 'materialIds', 'colors', 'textured', 'normalMapped', 'shininess', 'objectIds',
+)
+
+
+class CompiledScene:
+    def __init__(self, tree: AABBTree):
+        assert tree.depth + 1 <= kernels.STACK_SIZE, f'BVH com profundidade {tree.depth} não cabe na pilha dos kernels'
+        self.primitives: list[Object] = tree.primitives + tree.unbounded
+        self.n_bounded = len(tree.primitives)
+
+        spheres, planes, triangles, circles, cones, cylinders = [], [], [], [], [], []
+        self.kinds = np.zeros(len(self.primitives), dtype=np.int32)
+        self.indices = np.zeros(len(self.primitives), dtype=np.int32)
+        self.materials: list[Material] = []
+        self.materialIds = np.zeros(len(self.primitives), dtype=np.int32)
+        self.colors = np.zeros((len(self.primitives), 3), dtype=np.float64)
+        self.textured = np.zeros(len(self.primitives), dtype=np.bool_)
+        self.normalMapped = np.zeros(len(self.primitives), dtype=np.bool_)
+        # Id do objeto selecionável de cada primitiva, preenchido pela cena
+        self.objectIds = np.full(len(self.primitives), -1, dtype=np.int32)
+        materialIds = {}
+
+        for prim, primitive in enumerate(self.primitives):
+            # Triangle e Circle herdam de Plane, então precisam vir antes
+            if isinstance(primitive, Triangle):
+                kind, data = kernels.TRIANGLE, (triangles, [*primitive.normal, *primitive.A, *primitive.B, *primitive.C, primitive.area])
+            elif isinstance(primitive, Circle):
+                kind, data = kernels.CIRCLE, (circles, [*primitive.position, *primitive.normal, primitive.radius])
+            elif isinstance(primitive, Plane):
+                kind, data = kernels.PLANE, (planes, [*primitive.position, *primitive.normal])
+            elif isinstance(primitive, Sphere):
+                kind, data = kernels.SPHERE, (spheres, [*primitive.position, primitive.radius])
+            elif isinstance(primitive, Cone):
+                kind, data = kernels.CONE, (cones, [*primitive.position, *primitive.axis, primitive.height ** 2 / (primitive.height ** 2 + primitive.radius ** 2), primitive.height])
+            elif isinstance(primitive, Cylinder):
+                kind, data = kernels.CYLINDER, (cylinders, [*primitive.position, *primitive.axis, primitive.radius, primitive.height])
+            else:
+                raise TypeError(f'Primitiva não suportada: {primitive.__class__.__name__}')
+
+            array, values = data
+            self.kinds[prim] = kind
+            self.indices[prim] = len(array)
+            array.append(values)
+
+            material = primitive.material
+            if id(material) not in materialIds:
+                materialIds[id(material)] = len(self.materials)
+                self.materials.append(material)
+            self.materialIds[prim] = materialIds[id(material)]
+
+            texture = material.texture
+            self.textured[prim] = texture is not None
+            self.normalMapped[prim] = texture is not None and texture.normal_path is not None
+            if texture is None:
+                self.colors[prim] = primitive.getColor(primitive.position)
+
+        self.spheres = np.array(spheres, dtype=np.float64).reshape(-1, 4)
+        self.planes = np.array(planes, dtype=np.float64).reshape(-1, 6)
+        self.triangles = np.array(triangles, dtype=np.float64).reshape(-1, 13)
+        self.circles = np.array(circles, dtype=np.float64).reshape(-1, 7)
+        self.cones = np.array(cones, dtype=np.float64).reshape(-1, 8)
+        self.cylinders = np.array(cylinders, dtype=np.float64).reshape(-1, 8)
+
+        self.shininess = np.array([material.shininess for material in self.materials], dtype=np.float64)
+        self.nodes = (tree.nodeMin, tree.nodeMax, tree.nodeRight, tree.nodeAxis, tree.nodeStart, tree.nodeCount)
+
+        # Último bloqueador por luz e contadores [testes, bloqueados, acertos do cache].
+        # Cada processo recebe a sua cópia, então o cache é por processo
+        self.occluders: dict[int, np.ndarray] = {}
+        self.occluderStats: dict[int, np.ndarray] = {}
+
+    def __getstate__(self):
+        # Os processos de renderização recebem só os nomes dos blocos de memória compartilhada
+        return shared.shareState(self, SHARED_ARRAYS)
+
+    def __setstate__(self, state):
+        self.__dict__.update(shared.restoreState(state, SHARED_ARRAYS))
+
+    def getDigest(self) -> str:
+        # Resume a geometria e os materiais; a ordem das primitivas vem da BVH, que é determinística
+        digest = hashlib.sha1()
+        for array in (*self.geometry, self.kinds, self.materialIds, self.colors, self.textured, self.shininess):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    @property
+    def geometry(self):
+        return (self.spheres, self.planes, self.triangles, self.circles, self.cones, self.cylinders)
+
+    @property
+    def primitiveTable(self):
+        return (self.kinds, self.indices, self.n_bounded)
+
+    def intersect(self, origin: np.ndarray, direction: np.ndarray, t=np.inf, kind='bounce') -> tuple[float, int]:
+        t0 = time.perf_counter()
+        result = kernels.closest_hit(origin, direction, t, self.nodes, self.primitiveTable, self.geometry, stats.counters())
+        stats.record('trace', t0, kind, 1)
+        return result
+
+    def traceBatch(self, origins: np.ndarray, directions: np.ndarray, tMax: np.ndarray|float = np.inf, kind='primary', work: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        origins = np.ascontiguousarray(origins, dtype=np.float64)
+        directions = np.ascontiguousarray(directions, dtype=np.float64)
+        tMax = np.ascontiguousarray(np.broadcast_to(tMax, len(origins)), dtype=np.float64)
+
+        t0 = time.perf_counter()
+        ts, hits = kernels.closest_hit_batch(origins, directions, tMax, self.nodes, self.primitiveTable, self.geometry, stats.counters(), stats.NO_WORK if work is None else work)
+        stats.record('trace', t0, kind, len(origins))
+        points = np.full(origins.shape, np.nan)
+        hit = hits >= 0
+        points[hit] = origins[hit] + directions[hit] * ts[hit, None]
+        return ts, hits, points
+
+    def getOccluderCache(self, light: int) -> tuple[np.ndarray, np.ndarray]:
+        if light not in self.occluders:
+            self.occluders[light] = np.full(1, -1, dtype=np.int32)
+            self.occluderStats[light] = np.zeros(3, dtype=np.int64)
+
+        return self.occluders[light], self.occluderStats[light]
+
+    def popOccluderStats(self) -> dict[int, np.ndarray]:
+        stats = {light: values.copy() for light, values in self.occluderStats.items()}
+        for values in self.occluderStats.values():
+            values[:] = 0
+
+        return stats
+
+    def occluded(self, origin: np.ndarray, direction: np.ndarray, t=np.inf, light: int = None) -> bool:
+        t0 = time.perf_counter()
+        if light is None:
+            blocked = kernels.any_hit(origin, direction, t, self.nodes, self.primitiveTable, self.geometry, stats.counters())
+        else:
+            cache, occluderStats = self.getOccluderCache(light)
+            blocked = kernels.cached_any_hit(origin, direction, t, cache, occluderStats, self.nodes, self.primitiveTable, self.geometry, stats.counters())
+
+        stats.record('shadow', t0, 'shadow', 1)
+        return blocked
+
+    def occludedBatch(self, origins: np.ndarray, directions: np.ndarray, tMax: np.ndarray|float = np.inf, light: int = None, work: np.ndarray = None) -> np.ndarray:
+        origins = np.ascontiguousarray(origins, dtype=np.float64)
+        directions = np.ascontiguousarray(directions, dtype=np.float64)
+        tMax = np.ascontiguousarray(np.broadcast_to(tMax, len(origins)), dtype=np.float64)
+
+        work = stats.NO_WORK if work is None else work
+
+        t0 = time.perf_counter()
+        if light is None:
+            blocked = kernels.any_hit_batch(origins, directions, tMax, self.nodes, self.primitiveTable, self.geometry, stats.counters(), work)
+        else:
+            cache, occluderStats = self.getOccluderCache(light)
+            blocked = kernels.cached_any_hit_batch(origins, directions, tMax, cache, occluderStats, self.nodes, self.primitiveTable, self.geometry, stats.counters(), work)
+
+        stats.record('shadow', t0, 'shadow', len(origins))
+        return blocked
+
+    def getNormals(self, prims: np.ndarray, points: np.ndarray) -> np.ndarray:
+        kinds, indices = self.kinds[prims], self.indices[prims]
+        normals = np.empty_like(points)
+
+        mask = kinds == kernels.SPHERE
+        spheres = self.spheres[indices[mask]]
+        normals[mask] = (points[mask] - spheres[:, :3]) / spheres[:, 3:]
+
+        for kind, data, offset in (
+            (kernels.PLANE, self.planes, 3),
+            (kernels.TRIANGLE, self.triangles, 0),
+            (kernels.CIRCLE, self.circles, 3),
+        ):
+            mask = kinds == kind
+            normals[mask] = data[indices[mask], offset:offset+3]
+
+        for kind, data in ((kernels.CONE, self.cones), (kernels.CYLINDER, self.cylinders)):
+            mask = kinds == kind
+            positions, axes = data[indices[mask], 0:3], data[indices[mask], 3:6]
+            v = points[mask] - positions
+            n = v - axes * np.einsum('ij,ij->i', v, axes)[:, None]
+            normals[mask] = transforms.normalize_rows(n)
+
+        for i in np.flatnonzero(self.normalMapped[prims]):
+            normals[i] = self.primitives[prims[i]].getNormal(points[i])
+
+        return normals
+
+    def getColors(self, prims: np.ndarray, points: np.ndarray, footprints: np.ndarray = None, dtype=np.float64) -> np.ndarray:
+        t0 = time.perf_counter()
+        colors = self.colors[prims].astype(dtype, copy=False)
+        textured = np.flatnonzero(self.textured[prims])
+        for i in textured:
+            footprint = 0. if footprints is None else footprints[i]
+            colors[i] = self.primitives[prims[i]].getColor(points[i], footprint)
+
+        stats.lookup('texture', t0, len(textured))
+        return colors
@@ -0,0 +1,410 @@
+import math
+import numba
+import numpy as np
+
+
+T_CORRECTION = 0.00001
+STACK_SIZE = 64
+
+SPHERE, PLANE, TRIANGLE, CIRCLE, CONE, CYLINDER = range(6)
+
+# Contadores opcionais dos kernels: nós da BVH visitados, testes e acertos por tipo de primitiva.
+# Um array vazio desliga a contagem
+COUNT_NODES, COUNT_TESTS, COUNT_HITS = 0, 1, 7
+N_COUNTERS = 13
+
+
+# Versões em numba das funções de utils/physics.c
+
+@numba.njit(cache=True)
+def dot(v1, v2):
+    return v1[0] * v2[0] + v1[1] * v2[1] + v1[2] * v2[2]
+
+
+@numba.njit(cache=True)
+def sphere_intersection(origin, direction, rayT, sphere):
+    cox, coy, coz = origin[0] - sphere[0], origin[1] - sphere[1], origin[2] - sphere[2]
+    b = 2. * (cox * direction[0] + coy * direction[1] + coz * direction[2])
+    c = cox * cox + coy * coy + coz * coz - sphere[3] * sphere[3]
+    delta = b * b - 4. * c
+    if delta < 0.: return 0.
+
+    delta = math.sqrt(delta)
+    t1 = (-b + delta) / 2.
+    t2 = (-b - delta) / 2.
+    t = rayT
+    if 0. < t1 and t1 < t: t = t1
+    if 0. < t2 and t2 < t: t = t2
+    if t == rayT: return 0.
+
+    return t - T_CORRECTION
+
+
+@numba.njit(cache=True)
+def plane_distance(origin, direction, rayT, position, normal):
+    dn = dot(direction, normal)
+    if dn == 0.: return -1.
+
+    t = ((position[0] - origin[0]) * normal[0] + (position[1] - origin[1]) * normal[1] + (position[2] - origin[2]) * normal[2]) / dn
+    if t < 0. or rayT < t: return -1.
+
+    return t
+
+
+@numba.njit(cache=True)
+def plane_intersection(origin, direction, rayT, plane):
+    t = plane_distance(origin, direction, rayT, plane[0:3], plane[3:6])
+    if t < 0.: return 0.
+
+    return t - T_CORRECTION
+
+
+@numba.njit(cache=True)
+def triangle_intersection(origin, direction, rayT, triangle):
+    normal = triangle[0:3]
+    A, B, C = triangle[3:6], triangle[6:9], triangle[9:12]
+    t = plane_distance(origin, direction, rayT, A, normal)
+    if t < 0.: return 0.
+
+    px, py, pz = origin[0] + direction[0] * t, origin[1] + direction[1] * t, origin[2] + direction[2] * t
+    apx, apy, apz = A[0] - px, A[1] - py, A[2] - pz
+    bpx, bpy, bpz = B[0] - px, B[1] - py, B[2] - pz
+    cpx, cpy, cpz = C[0] - px, C[1] - py, C[2] - pz
+
+    c1 = ((apy * bpz - apz * bpy) * normal[0] + (apz * bpx - apx * bpz) * normal[1] + (apx * bpy - apy * bpx) * normal[2]) / triangle[12]
+    c2 = ((cpy * apz - cpz * apy) * normal[0] + (cpz * apx - cpx * apz) * normal[1] + (cpx * apy - cpy * apx) * normal[2]) / triangle[12]
+    c3 = 1. - c1 - c2
+
+    if c1 < -T_CORRECTION or c2 < -T_CORRECTION or c3 < -T_CORRECTION: return 0.
+
+    return t - T_CORRECTION
+
+
+@numba.njit(cache=True)
+def circle_intersection(origin, direction, rayT, circle):
+    position = circle[0:3]
+    t = plane_distance(origin, direction, rayT, position, circle[3:6])
+    if t < 0.: return 0.
+
+    ppx = origin[0] + direction[0] * t - position[0]
+    ppy = origin[1] + direction[1] * t - position[1]
+    ppz = origin[2] + direction[2] * t - position[2]
+    if math.sqrt(ppx * ppx + ppy * ppy + ppz * ppz) > circle[6]: return 0.
+
+    return t - T_CORRECTION
+
+
+@numba.njit(cache=True)
+def quadric_hit(origin, direction, rayT, position, axis, height, a, b, delta):
+    delta = math.sqrt(delta)
+    t1 = (-b - delta) / a
+    t2 = (-b + delta) / a
+    pox, poy, poz = position[0] - origin[0], position[1] - origin[1], position[2] - origin[2]
+    dp0 = pox * axis[0] + poy * axis[1] + poz * axis[2]
+    dn = dot(direction, axis)
+    dp1 = dp0 - t1 * dn
+    dp2 = dp0 - t2 * dn
+
+    t = rayT
+    if 0. < t1 and t1 < t and 0. <= dp1 and dp1 <= height: t = t1
+    if 0. < t2 and t2 < t and 0. <= dp2 and dp2 <= height: t = t2
+    if t == rayT: return 0.
+
+    return t - T_CORRECTION
+
+
+@numba.njit(cache=True)
+def cylinder_intersection(origin, direction, rayT, cylinder):
+    position, axis = cylinder[0:3], cylinder[3:6]
+    radius, height = cylinder[6], cylinder[7]
+
+    pox, poy, poz = origin[0] - position[0], origin[1] - position[1], origin[2] - position[2]
+    poa = pox * axis[0] + poy * axis[1] + poz * axis[2]
+    da = dot(direction, axis)
+    vx, vy, vz = pox - axis[0] * poa, poy - axis[1] * poa, poz - axis[2] * poa
+    wx, wy, wz = direction[0] - axis[0] * da, direction[1] - axis[1] * da, direction[2] - axis[2] * da
+
+    a = wx * wx + wy * wy + wz * wz
+    if a == 0.: return 0.
+
+    b = vx * wx + vy * wy + vz * wz
+    c = vx * vx + vy * vy + vz * vz - radius * radius
+    delta = b * b - a * c
+    if delta < 0.: return 0.
+
+    return quadric_hit(origin, direction, rayT, position, axis, height, a, b, delta)
+
+
+@numba.njit(cache=True)
+def cone_intersection(origin, direction, rayT, cone):
+    position, axis = cone[0:3], cone[3:6]
+    cos2, height = cone[6], cone[7]
+
+    vx, vy, vz = position[0] - origin[0], position[1] - origin[1], position[2] - origin[2]
+    dn = dot(direction, axis)
+    vn = vx * axis[0] + vy * axis[1] + vz * axis[2]
+
+    a = dn * dn - dot(direction, direction) * cos2
+    if a == 0.: return 0.
+
+    b = (vx * direction[0] + vy * direction[1] + vz * direction[2]) * cos2 - vn * dn
+    c = vn * vn - (vx * vx + vy * vy + vz * vz) * cos2
+    delta = b * b - a * c
+    if delta < 0.: return 0.
+
+    return quadric_hit(origin, direction, rayT, position, axis, height, a, b, delta)
+
+
+@numba.njit(cache=True)
+def primitive_intersection(origin, direction, rayT, kind, index, geometry):
+    spheres, planes, triangles, circles, cones, cylinders = geometry
+    if kind == SPHERE: return sphere_intersection(origin, direction, rayT, spheres[index])
+    if kind == PLANE: return plane_intersection(origin, direction, rayT, planes[index])
+    if kind == TRIANGLE: return triangle_intersection(origin, direction, rayT, triangles[index])
+    if kind == CIRCLE: return circle_intersection(origin, direction, rayT, circles[index])
+    if kind == CONE: return cone_intersection(origin, direction, rayT, cones[index])
+    return cylinder_intersection(origin, direction, rayT, cylinders[index])
+
+
+@numba.njit(cache=True)
+def count_test(counters, kind, hit):
+    counters[COUNT_TESTS + kind] += 1
+    if hit:
+        counters[COUNT_HITS + kind] += 1
+
+
+@numba.njit(cache=True)
+def total_work(counters):
+    work = counters[COUNT_NODES]
+    for kind in range(COUNT_HITS - COUNT_TESTS):
+        work += counters[COUNT_TESTS + kind]
+    return work
+
+
+@numba.njit(cache=True)
+def hits_box(boxMin, boxMax, origin, invDirection, tMax):
+    tNear, tFar = -np.inf, np.inf
+    for axis in range(3):
+        t0 = (boxMin[axis] - origin[axis]) * invDirection[axis]
+        t1 = (boxMax[axis] - origin[axis]) * invDirection[axis]
+        if t0 > t1: t0, t1 = t1, t0
+        if t0 > tNear: tNear = t0
+        if t1 < tFar: tFar = t1
+
+    return tNear <= tFar and tFar >= 0. and tNear <= tMax
+
+
+@numba.njit(cache=True)
+def inverse_direction(direction):
+    invDirection = np.empty(3)
+    for axis in range(3):
+        invDirection[axis] = 1. / (direction[axis] if direction[axis] != 0. else 1e-12)
+    return invDirection
+
+
+@numba.njit(cache=True)
+def closest_hit(origin, direction, rayT, nodes, primitives, geometry, counters):
+    nodeMin, nodeMax, nodeRight, nodeAxis, nodeStart, nodeCount = nodes
+    kinds, indices, n_bounded = primitives
+    hit = -1
+    counting = len(counters) > 0
+
+    for prim in range(n_bounded, len(kinds)):
+        t = primitive_intersection(origin, direction, rayT, kinds[prim], indices[prim], geometry)
+        if counting: count_test(counters, kinds[prim], t > 0. and t < rayT)
+        if t > 0. and t < rayT:
+            rayT, hit = t, prim
+
+    if len(nodeMin) == 0:
+        return rayT, hit
+
+    invDirection = inverse_direction(direction)
+    stack = np.empty(STACK_SIZE, dtype=np.int32)
+    stack[0] = 0
+    size = 1
+    while size > 0:
+        size -= 1
+        node = stack[size]
+        if counting: counters[COUNT_NODES] += 1
+        if not hits_box(nodeMin[node], nodeMax[node], origin, invDirection, rayT):
+            continue
+
+        count = nodeCount[node]
+        if count > 0:
+            start = nodeStart[node]
+            for prim in range(start, start + count):
+                t = primitive_intersection(origin, direction, rayT, kinds[prim], indices[prim], geometry)
+                if counting: count_test(counters, kinds[prim], t > 0. and t < rayT)
+                if t > 0. and t < rayT:
+                    rayT, hit = t, prim
+            continue
+
+        # Visita primeiro o filho mais próximo da origem do raio
+        if direction[nodeAxis[node]] < 0.:
+            stack[size], stack[size + 1] = node + 1, nodeRight[node]
+        else:
+            stack[size], stack[size + 1] = nodeRight[node], node + 1
+        size += 2
+
+    return rayT, hit
+
+
+@numba.njit(cache=True)
+def find_occluder(origin, direction, rayT, nodes, primitives, geometry, counters):
+    nodeMin, nodeMax, nodeRight, nodeAxis, nodeStart, nodeCount = nodes
+    kinds, indices, n_bounded = primitives
+    counting = len(counters) > 0
+
+    # Basta um bloqueador antes de rayT, então a busca para no primeiro acerto
+    for prim in range(n_bounded, len(kinds)):
+        t = primitive_intersection(origin, direction, rayT, kinds[prim], indices[prim], geometry)
+        if counting: count_test(counters, kinds[prim], t > 0. and t < rayT)
+        if t > 0. and t < rayT:
+            return prim
+
+    if len(nodeMin) == 0:
+        return -1
+
+    invDirection = inverse_direction(direction)
+    stack = np.empty(STACK_SIZE, dtype=np.int32)
+    stack[0] = 0
+    size = 1
+    while size > 0:
+        size -= 1
+        node = stack[size]
+        if counting: counters[COUNT_NODES] += 1
+        if not hits_box(nodeMin[node], nodeMax[node], origin, invDirection, rayT):
+            continue
+
+        count = nodeCount[node]
+        if count > 0:
+            start = nodeStart[node]
+            for prim in range(start, start + count):
+                t = primitive_intersection(origin, direction, rayT, kinds[prim], indices[prim], geometry)
+                if counting: count_test(counters, kinds[prim], t > 0. and t < rayT)
+                if t > 0. and t < rayT:
+                    return prim
+            continue
+
+        stack[size], stack[size + 1] = node + 1, nodeRight[node]
+        size += 2
+
+    return -1
+
+
+@numba.njit(cache=True)
+def any_hit(origin, direction, rayT, nodes, primitives, geometry, counters):
+    return find_occluder(origin, direction, rayT, nodes, primitives, geometry, counters) >= 0
+
+
+@numba.njit(cache=True)
+def cached_any_hit(origin, direction, rayT, cache, stats, nodes, primitives, geometry, counters):
+    # cache guarda o último bloqueador encontrado para a luz; stats conta
+    # testes, raios bloqueados e acertos do cache
+    kinds, indices, _ = primitives
+    stats[0] += 1
+    last = cache[0]
+    if last >= 0:
+        t = primitive_intersection(origin, direction, rayT, kinds[last], indices[last], geometry)
+        if len(counters) > 0: count_test(counters, kinds[last], t > 0. and t < rayT)
+        if t > 0. and t < rayT:
+            stats[1] += 1
+            stats[2] += 1
+            return True
+
+    prim = find_occluder(origin, direction, rayT, nodes, primitives, geometry, counters)
+    if prim < 0:
+        return False
+
+    cache[0] = prim
+    stats[1] += 1
+    return True
+
+
+@numba.njit(cache=True)
+def any_hit_batch(origins, directions, tMax, nodes, primitives, geometry, counters, work):
+    # work, quando não vazio, recebe os nós visitados mais os testes de cada raio
+    n_rays = len(origins)
+    blocked = np.empty(n_rays, dtype=np.bool_)
+    for ray in range(n_rays):
+        before = total_work(counters) if len(work) > 0 else 0
+        blocked[ray] = any_hit(origins[ray], directions[ray], tMax[ray], nodes, primitives, geometry, counters)
+        if len(work) > 0: work[ray] = total_work(counters) - before
+
+    return blocked
+
+
+@numba.njit(cache=True)
+def cached_any_hit_batch(origins, directions, tMax, cache, stats, nodes, primitives, geometry, counters, work):
+    n_rays = len(origins)
+    blocked = np.empty(n_rays, dtype=np.bool_)
+    for ray in range(n_rays):
+        before = total_work(counters) if len(work) > 0 else 0
+        blocked[ray] = cached_any_hit(origins[ray], directions[ray], tMax[ray], cache, stats, nodes, primitives, geometry, counters)
+        if len(work) > 0: work[ray] = total_work(counters) - before
+
+    return blocked
+
+
+@numba.njit(cache=True)
+def closest_hit_batch(origins, directions, tMax, nodes, primitives, geometry, counters, work):
+    n_rays = len(origins)
+    ts = np.empty(n_rays)
+    hits = np.empty(n_rays, dtype=np.int32)
+    for ray in range(n_rays):
+        before = total_work(counters) if len(work) > 0 else 0
+        ts[ray], hits[ray] = closest_hit(origins[ray], directions[ray], tMax[ray], nodes, primitives, geometry, counters)
+        if len(work) > 0: work[ray] = total_work(counters) - before
+
+    return ts, hits
+
+
+@numba.njit(cache=True)
+def cubemap_colors(faces, directions):
+    n_faces, height, width, _ = faces.shape
+    colors = np.empty((len(directions), 3))
+    for ray in range(len(directions)):
+        dx, dy, dz = directions[ray, 0], directions[ray, 1], directions[ray, 2]
+        ax, ay, az = abs(dx), abs(dy), abs(dz)
+
+        if ax > ay and ax > az:
+            face = 1 if dx > 0. else 3 # Direita/Esquerda
+            uc, vc = (-dz, -dy) if dx > 0. else (dz, -dy)
+            sc = 0.5 / ax
+        elif ay > az:
+            face = 4 if dy > 0. else 5 # Cima/Baixo
+            uc, vc = (dz, -dx) if dy > 0. else (dx, -dz)
+            sc = 0.5 / ay
+        else:
+            face = 0 if dz > 0. else 2 # Frente/Trás
+            uc, vc = (dx, -dy) if dz > 0. else (-dx, -dy)
+            sc = 0.5 / az
+
+        x = (uc * sc + 0.5) * (width - 1)
+        y = (vc * sc + 0.5) * (height - 1)
+        x0, y0 = int(x), int(y)
+        x1, y1 = min(x0 + 1, width - 1), min(y0 + 1, height - 1)
+        tx, ty = x - x0, y - y0
+
+        for channel in range(3):
+            c0 = faces[face, y0, x0, channel] * (1. - tx) + faces[face, y0, x1, channel] * tx
+            c1 = faces[face, y1, x0, channel] * (1. - tx) + faces[face, y1, x1, channel] * tx
+            colors[ray, channel] = c0 * (1. - ty) + c1 * ty
+
+    return colors
+
+
+@numba.njit(cache=True)
+def latlong_colors(table, directions):
+    height, width, _ = table.shape
+    colors = np.empty((len(directions), 3))
+    for ray in range(len(directions)):
+        dx, dy, dz = directions[ray, 0], directions[ray, 1], directions[ray, 2]
+        u = (math.atan2(dz, dx) + math.pi) / (2. * math.pi)
+        v = math.acos(min(max(dy, -1.), 1.)) / math.pi
+        x = min(int(u * width), width - 1)
+        y = min(int(v * height), height - 1)
+        for channel in range(3):
+            colors[ray, channel] = table[y, x, channel]
+
+    return colors
@@ -1,47 +1,81 @@
 import os
 import cv2
+import math
+import time
 import numpy as np
 from utils.ray import Ray
-from utils import transforms
+from utils import transforms, shared, textureRegistry, kernels, stats
 
 
 class Texture():
     def __init__(self, path: str, scale = 1.0, RGB = True, normal_path: str = None):
         self.path = os.path.join(os.getcwd(), 'assets', 'textures', path)
         self.scale = scale
-        self.image = cv2.imread(self.path)
         self.RGB = RGB
-        if not RGB:
-            self.image = cv2.cvtColor(self.image, cv2.COLOR_BGR2RGB)
 
         self.normal_path = None
-        self.normal_image = None
         if normal_path is not None:
             self.normal_path = os.path.join(os.getcwd(), 'assets', 'textures', normal_path)
-            self.normal_image = cv2.imread(self.normal_path)
-            self.normal_image = cv2.cvtColor(self.normal_image, cv2.COLOR_BGR2RGB)
 
-    def getColor(self, point: np.ndarray) -> np.ndarray:
-        x = int(point[0] / self.scale) % self.image.shape[1]
-        y = int(point[1] / self.scale) % self.image.shape[0]
-        return self.image[y, x]
+    def __getstate__(self):
+        # As imagens vão pelo registro de texturas; aqui seguem só os nomes dos blocos
+        state = self.__dict__.copy()
+        state['levelHandles'] = textureRegistry.export(self.path, not self.RGB)
+        if self.normal_path is not None:
+            state['normalHandles'] = textureRegistry.export(self.normal_path, True)
+        return state
+
+    def __setstate__(self, state):
+        textureRegistry.register(state['path'], not state['RGB'], state.pop('levelHandles'))
+        if state['normal_path'] is not None:
+            textureRegistry.register(state['normal_path'], True, state.pop('normalHandles'))
+        self.__dict__.update(state)
+
+    @property
+    def levels(self) -> list[np.ndarray]:
+        return textureRegistry.getLevels(self.path, not self.RGB)
+
+    @property
+    def image(self) -> np.ndarray:
+        return self.levels[0]
+
+    @property
+    def normal_image(self) -> np.ndarray:
+        if self.normal_path is None:
+            return None
+
+        return textureRegistry.getLevels(self.normal_path, True)[0]
+
+    def getColor(self, point: np.ndarray, footprint=0.) -> np.ndarray:
+        # footprint é a largura do pixel nas coordenadas de textura; o nível do
+        # mipmap é o que tem aproximadamente um texel por pixel
+        levels = self.levels
+        level = 0
+        if footprint > self.scale:
+            level = min(int(math.log2(footprint / self.scale)), len(levels) - 1)
+
+        image = levels[level]
+        x = int(point[0] / self.scale * image.shape[1] / levels[0].shape[1]) % image.shape[1]
+        y = int(point[1] / self.scale * image.shape[0] / levels[0].shape[0]) % image.shape[0]
+        return image[y, x]
 
     def getNormal(self, point: np.ndarray) -> np.ndarray:
-        if self.normal_image is None:
+        normal_image = self.normal_image
+        if normal_image is None:
             return None
 
-        x = int(point[0] / self.scale) % self.normal_image.shape[1]
-        y = int(point[1] / self.scale) % self.normal_image.shape[0]
-        return (self.normal_image[y, x] / 255.) * 2 - 1
+        x = int(point[0] / self.scale) % normal_image.shape[1]
+        y = int(point[1] / self.scale) % normal_image.shape[0]
+        return (normal_image[y, x] / 255.) * 2 - 1
 
     def copy(self):
         return Texture(self.path, self.scale, RGB=self.RGB, normal_path=self.normal_path)
 
 
 class CubeMapTexture:
-    def __init__(self, name: str):
+    def __init__(self, name: str, latlong: tuple[int, int] = None):
         self.name = name
-        self.faces = []
+        faces = []
         cubemap_path = os.path.join(os.getcwd(), 'assets', 'textures', 'skyboxes', name)
         for i in range(1, 7):
             path = os.path.join(cubemap_path, f'{i}.bmp')
@@ -49,44 +83,43 @@ class CubeMapTexture:
                 raise FileNotFoundError(f"Imagem do cubemap não encontrada em {path}")
 
             image = cv2.imread(path)
-            self.faces.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-
-    def getColor(self, direction: np.ndarray) -> np.ndarray:
-        abs_dir = np.abs(direction)
-
-        if abs_dir[0] > abs_dir[1] and abs_dir[0] > abs_dir[2]:
-            face_index = 1 if direction[0] > 0 else 3 # Direita/Esquerda
-            uc, vc = (-direction[2], -direction[1]) if direction[0] > 0 else (direction[2], -direction[1])
-            sc = 0.5 / abs_dir[0]
-        elif abs_dir[1] > abs_dir[2]:
-            face_index = 4 if direction[1] > 0 else 5 # Cima/Baixo
-            uc, vc = (direction[2], -direction[0]) if direction[1] > 0 else (direction[0], -direction[2])
-            sc = 0.5 / abs_dir[1]
+            faces.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+
+        if any(face.shape != faces[0].shape for face in faces):
+            raise ValueError(f'As faces do cubemap {name} devem ter o mesmo tamanho')
+
+        # As seis faces ficam num único array contíguo (6, H, W, 3)
+        self.faces = np.ascontiguousarray(np.stack(faces), dtype=np.float32)
+
+        # Opcionalmente, uma tabela lat-long (altura, largura) pré-calculada troca a
+        # interpolação bilinear por uma única leitura por direção
+        self.latlong = None
+        if latlong is not None:
+            height, width = latlong
+            v, u = (np.mgrid[0:height, 0:width] + 0.5) / np.array([height, width])[:, None, None]
+            theta, phi = u * 2 * np.pi - np.pi, v * np.pi
+            directions = np.stack((np.cos(theta) * np.sin(phi), np.cos(phi), np.sin(theta) * np.sin(phi)), axis=-1)
+            self.latlong = self.getColors(directions.reshape(-1, 3)).reshape(height, width, 3).astype(np.float32)
+
+    def __getstate__(self):
+        return shared.shareState(self, ('faces', 'latlong'))
+
+    def __setstate__(self, state):
+        self.__dict__.update(shared.restoreState(state, ('faces', 'latlong')))
+
+    def getColors(self, directions: np.ndarray) -> np.ndarray:
+        t0 = time.perf_counter()
+        directions = np.ascontiguousarray(directions, dtype=np.float64).reshape(-1, 3)
+        if self.latlong is not None:
+            colors = kernels.latlong_colors(self.latlong, directions)
         else:
-            face_index = 0 if direction[2] > 0 else 2 # Frente/Trás
-            uc, vc = (direction[0], -direction[1]) if direction[2] > 0 else (-direction[0], -direction[1])
-            sc = 0.5 / abs_dir[2]
-
-        u = (uc * sc + 0.5)
-        v = (vc * sc + 0.5)
+            colors = kernels.cubemap_colors(self.faces, directions)
 
-        face_image = self.faces[face_index]
-        height, width, _ = face_image.shape
+        stats.lookup('cubemap', t0, len(directions))
+        return colors
 
-        x = u * (width - 1)
-        y = v * (height - 1)
-        x0, y0 = int(x), int(y)
-        x1, y1 = min(x0 + 1, width - 1), min(y0 + 1, height - 1)
-        tx, ty = x - x0, y - y0
-
-        c00 = face_image[y0, x0]
-        c10 = face_image[y0, x1]
-        c01 = face_image[y1, x0]
-        c11 = face_image[y1, x1]
-
-        c0 = c00 * (1 - tx) + c10 * tx
-        c1 = c01 * (1 - tx) + c11 * tx
-        return c0 * (1 - ty) + c1 * ty
+    def getColor(self, direction: np.ndarray) -> np.ndarray:
+        return self.getColors(direction)[0]
 
 
 class Material():
@@ -106,9 +139,16 @@ class Material():
     def getColor(self) -> np.ndarray:
         return self.__color
 
-    def scatter(self, ray: Ray, point: np.ndarray, normal: np.ndarray) -> Ray:
+    def scatter(self, ray: Ray, point: np.ndarray, normal: np.ndarray, uv: np.ndarray = None) -> Ray:
         return None
 
+    def scatterBatch(self, directions: np.ndarray, points: np.ndarray, normals: np.ndarray, uv: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        return directions, np.zeros(len(directions))
+
+    def sampleBatch(self, directions: np.ndarray, normals: np.ndarray, albedo: np.ndarray, uv: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        # Direções amostradas pela BSDF e o fator (f * cos / pdf) que multiplica o caminho
+        return directions, np.zeros((len(directions), 3))
+
     def copy(self):
         return Material(self.__color.copy(), self.__shininess, self.texture.copy() if self.texture else None)
 
@@ -131,11 +171,11 @@ class Metal(Material):
     def getColor(self):
         return super().getColor() * self.roughness
 
-    def scatter(self, ray: Ray, point: np.ndarray, normal: np.ndarray) -> Ray:
+    def scatter(self, ray: Ray, point: np.ndarray, normal: np.ndarray, uv: np.ndarray = None) -> Ray:
         if self.reflectivity > 0:
             reflect_direction = transforms.reflect(ray.direction, normal)
             if self.fuzz > 0:
-                reflect_direction += transforms.random_unit_vector() * self.fuzz
+                reflect_direction += transforms.random_unit_vector(uv) * self.fuzz
                 reflect_direction = transforms.normalize(reflect_direction)
 
             reflect_ray = Ray(point, reflect_direction)
@@ -143,6 +183,26 @@ class Metal(Material):
 
         return None, 0
 
+    def scatterBatch(self, directions: np.ndarray, points: np.ndarray, normals: np.ndarray, uv: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        if self.reflectivity <= 0:
+            return directions, np.zeros(len(directions))
+
+        reflect_directions = transforms.reflect_rows(directions, normals)
+        if self.fuzz > 0:
+            reflect_directions += transforms.random_unit_vectors(len(directions), uv) * self.fuzz
+            reflect_directions = transforms.normalize_rows(reflect_directions)
+
+        return reflect_directions, np.ones(len(directions))
+
+    def sampleBatch(self, directions: np.ndarray, normals: np.ndarray, albedo: np.ndarray, uv: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        if self.reflectivity <= 0:
+            return directions, np.zeros((len(directions), 3))
+
+        reflect_directions, _ = self.scatterBatch(directions, None, normals, uv)
+        weights = albedo * self.reflectivity
+        weights[np.einsum('ij,ij->i', reflect_directions, normals) <= 0] = 0.
+        return reflect_directions, weights
+
     def copy(self):
         return Metal(
             self.color.copy(),
@@ -158,8 +218,8 @@ class Lambertian(Material):
     def __init__(self, color=np.array([255, 255, 255]), shininess=np.inf, texture: Texture=None):
         super().__init__(color, shininess, texture)
 
-    def scatter(self, ray: Ray, point: np.ndarray, normal: np.ndarray) -> Ray:
-        diffuse_direction = normal + transforms.random_unit_vector()
+    def scatter(self, ray: Ray, point: np.ndarray, normal: np.ndarray, uv: np.ndarray = None) -> Ray:
+        diffuse_direction = normal + transforms.random_unit_vector(uv)
         if (diffuse_direction < 1e-5).all():
             diffuse_direction = normal
 
@@ -167,6 +227,17 @@ class Lambertian(Material):
         diffuse_ray = Ray(point, diffuse_direction)
         return diffuse_ray, 0.5
 
+    def scatterBatch(self, directions: np.ndarray, points: np.ndarray, normals: np.ndarray, uv: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        diffuse_directions = normals + transforms.random_unit_vectors(len(normals), uv)
+        degenerate = (diffuse_directions < 1e-5).all(axis=1)
+        diffuse_directions[degenerate] = normals[degenerate]
+
+        return transforms.normalize_rows(diffuse_directions), np.full(len(normals), 0.5)
+
+    def sampleBatch(self, directions: np.ndarray, normals: np.ndarray, albedo: np.ndarray, uv: np.ndarray = None) -> tuple[np.ndarray, np.ndarray]:
+        # Com amostragem proporcional ao cosseno, f * cos / pdf se reduz ao albedo
+        return transforms.cosine_hemisphere_vectors(normals, uv), albedo
+
     def copy(self):
         return Lambertian(
             self.color.copy(),
@@ -16,7 +16,7 @@
 const double None = 0.0;
 
 
-float sphereIntersection(RAY_ARGS, double* position, double radius) {
+double sphereIntersection(RAY_ARGS, double* position, double radius) {
     double co[] = V_SUB(rayOrigin, position);
 
     double b = 2.*V_DOT(co, rayDirection);
@@ -37,7 +37,7 @@ float sphereIntersection(RAY_ARGS, double* position, double radius) {
 }
 
 
-float triangleIntersection(RAY_ARGS, double* position, double* normal, double* A, double* B, double* C, double area) {
+double triangleIntersection(RAY_ARGS, double* position, double* normal, double* A, double* B, double* C, double area) {
     double dn = V_DOT(rayDirection, normal);
     if (dn == 0.) return None;
 
@@ -63,7 +63,7 @@ float triangleIntersection(RAY_ARGS, double* position, double* normal, double* A
 }
 
 
-float cylinderIntersection(RAY_ARGS, double* position, double* axis, double radius, double height) {
+double cylinderIntersection(RAY_ARGS, double* position, double* axis, double radius, double height) {
     double po[] = V_SUB(rayOrigin, position);
     double v[] = V_MADD(po, axis, -V_DOT(po, axis));
     double w[] = V_MADD(rayDirection, axis, -V_DOT(rayDirection, axis));
@@ -95,7 +95,7 @@ float cylinderIntersection(RAY_ARGS, double* position, double* axis, double radi
 }
 
 
-float coneIntersection(RAY_ARGS, double* position, double* axis, double cos2, double height) {
+double coneIntersection(RAY_ARGS, double* position, double* axis, double cos2, double height) {
     double v[] = V_SUB(position, rayOrigin);
     double dn = V_DOT(rayDirection, axis);
     double vn = V_DOT(v, axis);
@@ -127,7 +127,7 @@ float coneIntersection(RAY_ARGS, double* position, double* axis, double cos2, do
     return t - T_CORRECTION;
 }
 
-float circleIntersection(RAY_ARGS, double* position, double* normal, double radius) {
+double circleIntersection(RAY_ARGS, double* position, double* normal, double radius) {
     double dn = V_DOT(rayDirection, normal);
     if (dn == 0.) return None;
 
@@ -142,7 +142,7 @@ float circleIntersection(RAY_ARGS, double* position, double* normal, double radi
     return t - T_CORRECTION;
 }
 
-float planeIntersection(RAY_ARGS, double* position, double* normal) {
+double planeIntersection(RAY_ARGS, double* position, double* normal) {
     double dn = V_DOT(rayDirection, normal);
     if (dn == 0.) return None;
 
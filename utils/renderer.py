@@ -0,0 +1,191 @@
+import gc
+import time
+import queue
+import signal
+import traceback
+import numpy as np
+import multiprocessing as mp
+from utils import shared, stats
+
+
+class Renderer:
+    def __init__(self, n_threads: int):
+        assert n_threads >= 1, f'O renderizador precisa de pelo menos um processo (n_threads={n_threads})'
+        self.n_threads = n_threads
+        self.synced = {}
+        self.buffers: dict[str, tuple[str, np.ndarray]] = {}
+        self.occluderStats: dict[int, np.ndarray] = {}
+        self.stats: dict[int, stats.RenderStats] = {}
+        self.tileTimes: list[tuple[tuple, float]] = []
+        self.elapsed = 0.
+        self.progressName, self.progress = shared.create((n_threads,), np.int64)
+        self.progress[:] = 0
+        self.closed = False
+
+        self.tasks = mp.Queue()
+        self.results = mp.Queue()
+        self.controls = [mp.Queue() for _ in range(n_threads)]
+        self.workers = [
+            mp.Process(target=work, args=(index, self.progressName, control, self.tasks, self.results), daemon=True)
+            for index, control in enumerate(self.controls)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def resetStats(self):
+        # As estatísticas somam todos os passos de uma renderização
+        self.occluderStats = {}
+        self.stats = {}
+        self.tileTimes = []
+        self.elapsed = 0.
+
+    def getBuffer(self, key: str, shape: tuple, dtype=np.float32) -> np.ndarray:
+        # Nos processos cada buffer vira um atributo da câmera com o mesmo nome
+        name, buffer = self.buffers.get(key, (None, None))
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            if name is not None:
+                shared.unlink(name)
+            self.buffers[key] = shared.create(shape, dtype)
+
+        return self.buffers[key][1]
+
+    def __delta(self, scene, camera):
+        # Só o que mudou desde a última renderização é enviado aos processos
+        assert scene.compiled is not None, 'A cena precisa estar compilada antes de ir para os processos'
+        updates = {}
+        if self.synced.get('scene') is not scene:
+            updates['scene'] = scene
+        else:
+            for key in ('compiled', 'cubemap'):
+                if self.synced.get(key) is not getattr(scene, key):
+                    updates[key] = getattr(scene, key)
+            updates['lights'] = scene.lights
+            updates['shadows'] = scene.shadows
+            updates['collectStats'] = scene.collectStats
+
+        buffers = {key: (name, buffer.shape, buffer.dtype.str) for key, (name, buffer) in self.buffers.items()}
+        if self.synced.get('buffers') != buffers:
+            updates['buffers'] = buffers
+
+        # A geometria e o cubemap substituídos deixam a memória compartilhada aqui e nos processos
+        released = []
+        for key in ('compiled', 'cubemap'):
+            previous = self.synced.get(key)
+            if previous is not None and previous is not getattr(scene, key):
+                released += shared.releaseState(previous)
+        if released:
+            updates['released'] = released
+
+        updates['camera'] = camera
+        self.synced.update(scene=scene, compiled=scene.compiled, cubemap=scene.cubemap, buffers=buffers)
+        return updates
+
+    def render(self, scene, camera, tasks: list[tuple]) -> list[tuple[tuple, float]]:
+        self.progress[:] = 0
+        t0 = time.perf_counter()
+
+        updates = self.__delta(scene, camera)
+        for control in self.controls:
+            control.put(updates)
+        for task in tasks:
+            self.tasks.put(task)
+        for _ in self.workers:
+            self.tasks.put(None)
+
+        errors, timings = [], []
+        for _ in self.workers:
+            message = self.receive()
+            if message is None:
+                return timings
+            if message[0] == 'error':
+                errors.append(message[2])
+            else:
+                timings.extend(message[2])
+                for light, values in message[3].items():
+                    self.occluderStats[light] = self.occluderStats.get(light, 0) + values
+                if message[4] is not None:
+                    self.stats[message[1]] = self.stats.get(message[1], stats.RenderStats()) + message[4]
+
+        self.elapsed += time.perf_counter() - t0
+        self.tileTimes.extend(timings)
+        if errors:
+            raise RuntimeError('Falha na renderização:\n' + errors[0])
+
+        return timings
+
+    def receive(self):
+        # Um processo que morreu nunca responde, então a espera confere se todos continuam vivos
+        while True:
+            try:
+                return self.results.get(timeout=1)
+            except queue.Empty:
+                dead = [worker for worker in self.workers if not worker.is_alive()]
+                if dead:
+                    self.shutdown()
+                    raise RuntimeError(f'O processo de renderização {dead[0].name} terminou com código {dead[0].exitcode}')
+
+    def getStats(self) -> dict:
+        return stats.summarize(self.stats, self.elapsed, self.occluderStats, self.tileTimes)
+
+    def shutdown(self):
+        if self.closed: return
+        self.closed = True
+
+        for control in self.controls:
+            control.put(None)
+        self.results.put(None)
+        for worker in self.workers:
+            worker.join(timeout=1)
+            if worker.is_alive():
+                worker.terminate()
+
+        for name, _ in self.buffers.values():
+            shared.unlink(name)
+        shared.unlink(self.progressName)
+        for key in ('compiled', 'cubemap'):
+            if self.synced.get(key) is not None:
+                shared.releaseState(self.synced[key])
+
+
+def work(index: int, progressName: str, control: mp.Queue, tasks: mp.Queue, results: mp.Queue):
+    # Ctrl-C é tratado pelo processo principal, que para a renderização no fim do passo
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    progress = shared.attach(progressName, (index + 1,), np.int64)[index:]
+
+    # A câmera chega nova a cada renderização, mas os buffers só quando mudam
+    scene, camera, buffers = None, None, {}
+    while (updates := control.get()) is not None:
+        released = updates.pop('released', [])
+        if 'scene' in updates:
+            scene = updates.pop('scene')
+        for key, value in updates.items():
+            if key == 'camera':
+                camera = value
+            elif key == 'buffers':
+                buffers = {key: shared.attach(name, shape, np.dtype(dtype)) for key, (name, shape, dtype) in value.items()}
+            else:
+                setattr(scene, key, value)
+        camera.__dict__.update(buffers, scene=scene, progress=progress)
+        if released:
+            # Só depois que a cena antiga deixa de ser referenciada os blocos podem ser fechados
+            gc.collect()
+            shared.release(released)
+        stats.current = stats.RenderStats() if scene.collectStats else None
+
+        error, timings = None, []
+        while (task := tasks.get()) is not None:
+            if error is not None: continue
+            try:
+                t0 = time.perf_counter()
+                camera.renderTask(*task)
+                timings.append((task, time.perf_counter() - t0))
+                if stats.current is not None:
+                    stats.current.times['total'] += timings[-1][1]
+                    stats.current.tasks += 1
+            except Exception:
+                error = traceback.format_exc()
+
+        if error is not None:
+            results.put(('error', index, error))
+        else:
+            results.put(('done', index, timings, scene.compiled.popOccluderStats(), stats.current))
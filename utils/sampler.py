@@ -0,0 +1,118 @@
+import math
+import numpy as np
+
+
+PRIMES = np.array([2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53, 59, 61, 67, 71, 73, 79, 83, 89, 97, 101, 103, 107, 109, 113, 127, 131])
+MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def mix(values: np.ndarray) -> np.ndarray:
+    # splitmix64: embaralha os bits de cada chave de forma determinística
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def hash_keys(*keys) -> np.ndarray:
+    values = np.full(np.broadcast(*keys).shape, 0x9E3779B97F4A7C15, dtype=np.uint64)
+    for key in keys:
+        values = mix(values ^ np.asarray(key).astype(np.uint64))
+
+    return values & MASK32
+
+
+def to_unit(values: np.ndarray) -> np.ndarray:
+    return np.minimum(values.astype(np.float64) / 4294967296., 1. - 2 ** -53)
+
+
+def reverse_bits(values: np.ndarray) -> np.ndarray:
+    result = np.zeros_like(values)
+    for bit in range(32):
+        result |= ((values >> np.uint64(bit)) & np.uint64(1)) << np.uint64(31 - bit)
+
+    return result
+
+
+def sobol_second(values: np.ndarray) -> np.ndarray:
+    # Segunda dimensão de Sobol (polinômio x + 1): com a primeira forma uma (0, 2)-sequência
+    result = np.zeros_like(values)
+    direction = np.uint64(1 << 31)
+    for bit in range(32):
+        result ^= np.where((values >> np.uint64(bit)) & np.uint64(1), direction, np.uint64(0))
+        direction = direction ^ (direction >> np.uint64(1))
+
+    return result
+
+
+def radical_inverse(values: np.ndarray, base: int) -> np.ndarray:
+    values = values.astype(np.int64)
+    result = np.zeros(len(values))
+    scale = 1. / base
+    while values.any():
+        result += (values % base) * scale
+        values //= base
+        scale /= base
+
+    return result
+
+
+class Sampler:
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    def get2D(self, pixels: np.ndarray, samples: np.ndarray, dimension: int) -> np.ndarray:
+        return np.random.random((len(pixels), 2))
+
+
+class StratifiedSampler(Sampler):
+    def __init__(self, n_samples: int, seed=0):
+        super().__init__(seed)
+        self.strata = max(math.ceil(math.sqrt(n_samples)), 1)
+
+    def get2D(self, pixels, samples, dimension):
+        # Cada amostra cai num estrato diferente da grade; o deslocamento por
+        # pixel e dimensão evita que as dimensões fiquem correlacionadas
+        n_strata = self.strata * self.strata
+        offsets = hash_keys(pixels, dimension, self.seed) % np.uint64(n_strata)
+        strata = (np.asarray(samples).astype(np.uint64) + offsets) % np.uint64(n_strata)
+        cells = np.stack((strata % np.uint64(self.strata), strata // np.uint64(self.strata)), axis=1)
+        return (cells + np.random.random((len(pixels), 2))) / self.strata
+
+
+class HaltonSampler(Sampler):
+    def get2D(self, pixels, samples, dimension):
+        samples = np.asarray(samples)
+        bases = PRIMES[(2 * dimension) % len(PRIMES)], PRIMES[(2 * dimension + 1) % len(PRIMES)]
+
+        # Rotação de Cranley-Patterson por pixel para não repetir o padrão na imagem
+        points = np.stack([radical_inverse(samples, base) for base in bases], axis=1)
+        rotation = np.stack([to_unit(hash_keys(pixels, dimension, axis, self.seed)) for axis in range(2)], axis=1)
+        return (points + rotation) % 1.
+
+
+class SobolSampler(Sampler):
+    def get2D(self, pixels, samples, dimension):
+        samples = np.asarray(samples).astype(np.uint64)
+
+        # Embaralhamento por XOR dos dígitos, com semente por pixel e dimensão
+        x = reverse_bits(samples) ^ hash_keys(pixels, dimension, 0, self.seed)
+        y = sobol_second(samples) ^ hash_keys(pixels, dimension, 1, self.seed)
+        return np.stack((to_unit(x), to_unit(y)), axis=1)
+
+
+SAMPLERS = {
+    'random': Sampler,
+    'stratified': StratifiedSampler,
+    'halton': HaltonSampler,
+    'sobol': SobolSampler,
+}
+
+
+def getSampler(name: str, n_samples: int, seed=0) -> Sampler:
+    assert name in SAMPLERS, f'Amostrador inválido: {name}'
+    if name == 'stratified':
+        return StratifiedSampler(n_samples, seed)
+
+    return SAMPLERS[name](seed)
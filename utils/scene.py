@@ -1,19 +1,24 @@
 import cv2
 import time
+import hashlib
 import numba
 import numpy as np
 from utils.ray import Ray
 from threading import Thread
-from utils import transforms
-from utils.camera import Camera
+from utils import transforms, stats
+from utils.renderer import Renderer
+from utils.camera import Camera, SKY_COLOR
 from lights.lights import Light
 from objects import Object, Cone
+from objects.bvh import AABBTree
+from utils.compiledScene import CompiledScene
 from utils.material import CubeMapTexture
-from OpenGL.GL import glDrawPixels, GL_RGB, GL_UNSIGNED_BYTE
 
+# Distância até onde a sombra de um objeto movido é considerada ao marcar a região suja
+SHADOW_REACH = 1e6
 
 class Scene:
-    def __init__(self, width: int, height: int, camera: Camera, objects: list[Object], lights: list[Light], shadows=True):
+    def __init__(self, width: int, height: int, camera: Camera, objects: list[Object], lights: list[Light], shadows=True, collect_stats=False):
         self.width = width
         self.height = height
         self.camera = camera
@@ -21,12 +26,28 @@ class Scene:
         self.lights = lights
         self.loaded = False
         self.loading = False
-        self.image = camera.buffer
+        self.image = camera.display
         self.shadows = shadows
+        self.collectStats = collect_stats
+        self.showHeatmap = False
         self.camera.scene = self
         self.updateCamera: Camera = None
         self.printLoading = True
         self.cubemap: CubeMapTexture = None
+        self.compiled: CompiledScene = None
+        self.renderer: Renderer = None
+        self.compiledCamera: Camera = None
+        # Objetos selecionáveis na ordem em que apareceram; o índice é o id usado no
+        # buffer de objetos da câmera e não muda quando a cena é recompilada
+        self.pickables: list[Object] = []
+        self.pickableIds: dict[int, int] = {}
+
+    def __getstate__(self):
+        # Os processos de renderização só usam a geometria compilada, luzes e cubemap
+        state = self.__dict__.copy()
+        for key in ('objects', 'image', 'camera', 'updateCamera', 'renderer', 'compiledCamera', 'pickables', 'pickableIds'):
+            state[key] = None
+        return state
 
     def __rebuild_triangles(self, obj: Object):
         if obj.isMesh:
@@ -35,34 +56,147 @@ class Scene:
             for obj in obj.parts:
                 self.__rebuild_triangles(obj)
 
-    def __threadedRaycast(self):
-        for obj in self.objects: self.__rebuild_triangles(obj)
-        for obj in self.objects: obj.preCalc(True)
+    def __flatten(self, obj: Object):
+        if not obj.isComplex:
+            yield obj
+            return
+
+        for part in obj.parts:
+            yield from self.__flatten(part)
+
+    def compile(self):
+        self.compiled = CompiledScene(AABBTree([primitive for obj in self.objects for primitive in self.__flatten(obj)]))
+        self.compiled.objectIds[:] = [self.getObjectId(primitive) for primitive in self.compiled.primitives]
+
+    def getPickable(self, obj: Object) -> Object:
+        # Sobe até o objeto de topo, exceto quando o pai é a BVH que agrupa a cena
+        while obj.superObject is not None and (not obj.superObject.isBVH or obj.superObject.superObject is not None):
+            obj = obj.superObject
+        return obj
+
+    def getObjectId(self, primitive: Object) -> int:
+        obj = self.getPickable(primitive)
+        if id(obj) not in self.pickableIds:
+            self.pickableIds[id(obj)] = len(self.pickables)
+            self.pickables.append(obj)
+        return self.pickableIds[id(obj)]
+
+    def getBounds(self, obj: Object) -> tuple[np.ndarray, np.ndarray]|None:
+        # As malhas são medidas pelos vértices, já que os triângulos só são refeitos na renderização
+        if obj.isMesh:
+            vertices = np.array(obj.vertices)
+            return vertices.min(axis=0), vertices.max(axis=0)
+        if not obj.isComplex:
+            return obj.getBounds()
+
+        bounds = [self.getBounds(part) for part in obj.parts]
+        if not bounds or any(bound is None for bound in bounds):
+            return None
+        return np.min([lo for lo, _ in bounds], axis=0), np.max([hi for _, hi in bounds], axis=0)
+
+    def getAffectedPoints(self, bounds: tuple[np.ndarray, np.ndarray]) -> np.ndarray:
+        # Cantos da caixa e, com sombras, os mesmos cantos empurrados para longe de cada luz;
+        # a projeção deles cobre o objeto e a sombra que ele projeta
+        lo, hi = bounds
+        corners = np.array(np.meshgrid(*zip(lo, hi))).reshape(3, -1).T
+        points = [corners]
+        if self.shadows:
+            for light in self.lights:
+                if light.ignoreShadow: continue
+                directions, _ = light.getDirections(corners)
+                points.append(corners - directions * SHADOW_REACH)
+
+        return np.concatenate(points)
+
+    def moved(self, obj: Object, before: tuple[np.ndarray, np.ndarray]|None):
+        assert not self.loading, 'A cena não pode mudar durante a renderização'
+        self.compiled = None
+        after = self.getBounds(obj)
+        if before is None or after is None:
+            self.camera.markDirty(None)
+            return
+
+        self.camera.markDirty(np.concatenate([self.getAffectedPoints(before), self.getAffectedPoints(after)]))
+
+    def getLighting(self) -> tuple:
+        return self.shadows, tuple(light.on for light in self.lights)
+
+    def getDigest(self) -> str:
+        # Geometria, materiais e parâmetros das luzes; muda sempre que a imagem mudaria
+        if self.compiled is None:
+            self.compile()
+        digest = hashlib.sha1(self.compiled.getDigest().encode())
+        for light in self.lights:
+            digest.update(light.__class__.__name__.encode())
+            for key, value in sorted(vars(light).items()):
+                if isinstance(value, (int, float, np.ndarray)):
+                    digest.update(key.encode() + np.asarray(value, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def render(self) -> float:
+        # A geometria só é recompilada quando muda (endGrab zera self.compiled) ou quando
+        # a câmera muda, já que as malhas descartam as faces de costas para ela
+        if self.compiled is None or self.compiledCamera is not self.camera:
+            for obj in self.objects: self.__rebuild_triangles(obj)
+            self.compile()
+            self.compiledCamera = self.camera
         self.t0 = time.time()
         self.camera.rayCast(self)
-        print(time.time() - self.t0)
-        self.loading = False
-        self.loaded = True
-        for obj in self.objects: obj.preCalc()
+        return time.time() - self.t0
 
+    def __threadedRaycast(self):
+        # Mesmo se a renderização falhar a janela volta a aceitar novas renderizações
+        try:
+            print(self.render())
+            if self.renderer is not None and self.renderer.stats:
+                print(stats.report(self.renderer.getStats()))
+        finally:
+            self.loading = False
+            self.loaded = True
+
+    def getRenderer(self, n_threads: int) -> Renderer:
+        if self.renderer is not None and (self.renderer.closed or self.renderer.n_threads != n_threads):
+            self.renderer.shutdown()
+            self.renderer = None
+        if self.renderer is None:
+            self.renderer = Renderer(n_threads)
+
+        return self.renderer
+
+    def stop(self):
+        if self.loading:
+            self.camera.stop()
+
+    def close(self):
+        if self.renderer is not None:
+            self.renderer.shutdown()
+            self.renderer = None
 
     def update(self):
+        # OpenGL só é carregado pela janela interativa
+        from OpenGL.GL import glDrawPixels, GL_RGB, GL_UNSIGNED_BYTE
+
         if not self.loaded and not self.loading:
             self.loading = True
             if self.updateCamera is not None:
                 self.camera = self.updateCamera
                 self.updateCamera = None
-                self.image = self.camera.buffer
+                self.image = self.camera.display
                 self.camera.scene = self
             Thread(target=self.__threadedRaycast, daemon=True).start()
 
-        glDrawPixels(self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, self.image)
+        image = self.image
+        if self.showHeatmap and hasattr(self.camera, 'costs'):
+            image, _ = self.camera.getHeatmap()
+        glDrawPixels(self.width, self.height, GL_RGB, GL_UNSIGNED_BYTE, image)
 
         if hasattr(self.camera, 'shared_progress'):
             if self.loading:
                 self.printLoading = True
-                already_rendered = self.camera.shared_progress[0] / (self.camera.resolution[0] * self.camera.resolution[1])
+                already_rendered = self.camera.getProgress()
                 print(' ' * 20 + f'\rRenderizando cenário: {(already_rendered * 100):.2f}%', end='')
+                if self.camera.accumulating:
+                    print(f' - Passo {self.camera.passes}', end='')
                 if already_rendered > 0:
                     now = time.time()
                     elapsed_time = now - self.t0
@@ -72,52 +206,60 @@ class Scene:
                 self.printLoading = False
                 print(f'\nCenário renderizado em {format_time(time.time() - self.t0)}!')
 
-    def rayTrace(self, ray: Ray) -> tuple[np.ndarray, Object, float]:
-        point, target, t = None, None, np.inf
-        def __loop(object, ray, simulate=False):
-            if object.isComplex:
-                if object.isBVH:
-                    if (
-                        object.bounding.isComplex and any(__loop(object, Ray(ray.origin, ray.direction, ray.t), True) for object in object.bounding.parts)
-                        or object.intersects(ray) is not None
-                    ):
-                        for object in object.parts:
-                            __loop(object, ray)
-                else:
-                    for object in object.parts:
-                        __loop(object, ray)
-                return
+    def saveImage(self, path: str):
+        # O buffer está de baixo para cima, como o glDrawPixels espera
+        cv2.imwrite(path, cv2.flip(self.camera.display[..., ::-1], 0))
+
+    def rayTrace(self, ray: Ray) -> tuple[np.ndarray, Object]:
+        if self.compiled is None:
+            self.compile()
+
+        t, prim = self.compiled.intersect(ray.origin, ray.direction, ray.t)
+        if prim < 0:
+            return None, None
+
+        ray.t = t
+        return ray.hitting_point, self.compiled.primitives[prim]
+
+    def traceBatch(self, origins: np.ndarray, directions: np.ndarray, tmax: np.ndarray|float = np.inf, kind='primary', work: np.ndarray = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self.compiled is None:
+            self.compile()
+
+        return self.compiled.traceBatch(origins, directions, tmax, kind, work)
 
-            nonlocal point, target, t
-            hit_point = object.intersects(ray)
-            if ray.t < t:
-                if simulate:
-                    return True
+    def occluded(self, origin: np.ndarray, direction: np.ndarray, max_t=np.inf, light: int = None) -> bool:
+        if self.compiled is None:
+            self.compile()
 
-                target = object
-                point = hit_point
-                t = ray.t
+        return self.compiled.occluded(origin, direction, max_t, light)
 
-        for object in self.objects:
-            __loop(object, ray)
+    def occludedBatch(self, origins: np.ndarray, directions: np.ndarray, max_t: np.ndarray|float = np.inf, light: int = None, work: np.ndarray = None) -> np.ndarray:
+        if self.compiled is None:
+            self.compile()
 
-        return point, target
+        return self.compiled.occludedBatch(origins, directions, max_t, light, work)
 
-    def computeLightness(self, point: np.ndarray, normal: np.ndarray, ray: Ray, target: Object):
+    def getPrimitive(self, prim: int) -> Object:
+        if prim < 0:
+            return None
+
+        return self.compiled.primitives[prim]
+
+    def computeLightness(self, point: np.ndarray, normal: np.ndarray, ray: Ray, target: Object, footprint=0.):
         lightness = np.array([0., 0., 0.])
         if self.shadows:
-            for light in self.lights:
+            for index, light in enumerate(self.lights):
                 if light.on is False: continue
                 if light.ignoreShadow:
                     lightness += light.computeLight() * light.color
                     continue
 
+                light_lightness = light.computeLight(point, normal, ray, target.material)
+                if light_lightness <= 0: continue
+
                 lightDirection, lightDistance = light.getDirection(point)
-                ray2 = Ray(point, lightDirection)
-                ray2.t = lightDistance
-                self.rayTrace(ray2)
-                if ray2.t >= lightDistance:
-                    lightness += light.computeLight(point, normal, ray, target.material) * light.color
+                if not self.occluded(point, lightDirection, lightDistance, index):
+                    lightness += light_lightness * light.color
         else:
             for light in self.lights:
                 if light.on is False: continue
@@ -126,14 +268,78 @@ class Scene:
                 else:
                     lightness += light.computeLight(point, normal, ray, target.material) * light.color
 
-        return target.getColor(point) * lightness
+        t0 = time.perf_counter()
+        color = target.getColor(point, footprint)
+        if target.material.texture is not None:
+            stats.lookup('texture', t0)
+
+        return color * lightness
+
+
+    def __computeLightBatch(self, index: int, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, shininess: np.ndarray, costs: np.ndarray = None) -> np.ndarray:
+        light = self.lights[index]
+        lightness = light.computeLightBatch(points, normals, directions, shininess)
+        lit = np.flatnonzero(lightness > 0)
+        if self.shadows and not light.ignoreShadow and len(lit) > 0:
+            lightDirections, lightDistances = light.getDirections(points[lit])
+            work = None if costs is None else np.zeros(len(lit))
+            lightness[lit[self.occludedBatch(points[lit], lightDirections, lightDistances, index, work)]] = 0
+            if costs is not None:
+                costs[lit] += work
+
+        return lightness
+
+    def computeLightnessBatch(self, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, prims: np.ndarray, footprints: np.ndarray = None, costs: np.ndarray = None, dtype=np.float64) -> np.ndarray:
+        return self.compiled.getColors(prims, points, footprints, dtype) * self.computeLightsBatch(points, normals, directions, prims, costs, dtype)
+
+    def computeLightsBatch(self, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, prims: np.ndarray, costs: np.ndarray = None, dtype=np.float64) -> np.ndarray:
+        lightness = np.zeros((len(points), 3), dtype=dtype)
+        shininess = self.compiled.shininess[self.compiled.materialIds[prims]]
+        for index, light in enumerate(self.lights):
+            if light.on is False: continue
+            lightness += self.__computeLightBatch(index, points, normals, directions, shininess, costs)[:, None] * light.color
+
+        return lightness
+
+    def sampleLightsBatch(self, points: np.ndarray, normals: np.ndarray, directions: np.ndarray, prims: np.ndarray, costs: np.ndarray = None, ambient=True, dtype=np.float64) -> np.ndarray:
+        lightness = np.zeros((len(points), 3), dtype=dtype)
+        shininess = self.compiled.shininess[self.compiled.materialIds[prims]]
+        lights = [index for index, light in enumerate(self.lights) if light.on]
+        for index in lights:
+            if self.lights[index].ignoreShadow and ambient:
+                lightness += self.lights[index].computeLightBatch(points)[:, None] * self.lights[index].color
+
+        # Cada ponto amostra uma única luz, escolhida com probabilidade proporcional à potência
+        sampled = [index for index in lights if not self.lights[index].ignoreShadow]
+        power = np.array([np.mean(self.lights[index].intensity * self.lights[index].color) for index in sampled])
+        if len(sampled) == 0 or power.sum() <= 0:
+            return lightness
+
+        pmf = power / power.sum()
+        choices = np.minimum(np.searchsorted(np.cumsum(pmf), np.random.random(len(points)), side='right'), len(sampled) - 1)
+        for choice, index in enumerate(sampled):
+            group = np.flatnonzero(choices == choice)
+            if len(group) == 0: continue
+
+            groupCosts = None if costs is None else np.zeros(len(group))
+            light_lightness = self.__computeLightBatch(index, points[group], normals[group], directions[group], shininess[group], groupCosts)
+            if costs is not None:
+                costs[group] += groupCosts
+            lightness[group] += (light_lightness / pmf[choice])[:, None] * self.lights[index].color
+
+        return lightness
+
+    def getBackground(self, directions: np.ndarray) -> np.ndarray:
+        if self.cubemap is None:
+            return np.tile(SKY_COLOR, (len(directions), 1))
 
+        return self.cubemap.getColors(directions)
 
     def pushCamera(self, camera:Camera):
         self.updateCamera = camera
 
-    def load_cubemap(self, cubemap_name: str):
-        self.cubemap = CubeMapTexture(cubemap_name)
+    def load_cubemap(self, cubemap_name: str, latlong: tuple[int, int] = None):
+        self.cubemap = CubeMapTexture(cubemap_name, latlong)
 
 
 def format_time(time: float):
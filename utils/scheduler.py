@@ -0,0 +1,60 @@
+import numpy as np
+
+
+class TileScheduler:
+    def __init__(self, tileSize=16, probes=4):
+        self.tileSize = tileSize
+        self.probes = probes
+        self.resolution: tuple[int, int] = None
+        self.tiles: list[tuple[int, int, int, int]] = []
+        self.times: dict[tuple[int, int, int, int], float] = {}
+
+    def split(self, resolution: np.ndarray) -> list[tuple[int, int, int, int]]:
+        width, height = int(resolution[0]), int(resolution[1])
+        if self.resolution != (width, height):
+            self.resolution = (width, height)
+            self.times = {}
+            self.tiles = [
+                (x0, y0, min(x0 + self.tileSize, width), min(y0 + self.tileSize, height))
+                for y0 in range(0, height, self.tileSize)
+                for x0 in range(0, width, self.tileSize)
+            ]
+
+        return self.tiles
+
+    def estimate(self, camera) -> np.ndarray:
+        # Sem tempos de uma renderização anterior, uma pré-passagem com poucos
+        # raios primários por tile estima onde há geometria para sombrear
+        xs, ys, owners = [], [], []
+        for tile, (x0, y0, x1, y1) in enumerate(self.tiles):
+            px = np.linspace(x0, x1 - 1, min(self.probes, x1 - x0)).astype(np.int32)
+            py = np.linspace(y0, y1 - 1, min(self.probes, y1 - y0)).astype(np.int32)
+            px, py = np.meshgrid(px, py)
+            xs.append(px.ravel())
+            ys.append(py.ravel())
+            owners.append(np.full(px.size, tile))
+
+        xs, ys, owners = np.concatenate(xs), np.concatenate(ys), np.concatenate(owners)
+        origins, directions = camera.getRays(xs, ys, np.zeros(len(xs), dtype=np.int64))
+        _, prims, _ = camera.scene.traceBatch(origins, directions)
+        hits = np.bincount(owners, weights=prims >= 0, minlength=len(self.tiles))
+        probes = np.bincount(owners, minlength=len(self.tiles))
+
+        # Cada acerto custa o sombreamento, um raio de sombra por luz e os rebatimentos
+        scene = camera.scene
+        shadowed = sum(light.on and not light.ignoreShadow for light in scene.lights) if scene.shadows else 0
+        return (1. + hits / probes * (1 + shadowed + camera.debounces)) * probes
+
+    def schedule(self, camera) -> list[tuple[int, int, int, int]]:
+        tiles = self.split(camera.resolution)
+        if all(tile in self.times for tile in tiles):
+            costs = np.array([self.times[tile] for tile in tiles])
+        else:
+            costs = self.estimate(camera)
+
+        # Os tiles mais caros saem primeiro; os processos livres puxam os
+        # restantes da fila compartilhada, então a cauda fica com tiles baratos
+        return [tiles[i] for i in np.argsort(-costs, kind='stable')]
+
+    def record(self, timings: list[tuple[tuple[int, int, int, int], float]]):
+        self.times.update(timings)
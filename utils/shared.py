@@ -0,0 +1,112 @@
+import atexit
+import threading
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+
+
+# Os blocos ficam mapeados até o fim do processo: fechar um bloco que ainda
+# tem arrays apontando para ele derruba o processo
+blocks: dict[str, SharedMemory] = {}
+created: set[str] = set()
+# As filas dos processos serializam em threads próprias, uma por fila
+lock = threading.RLock()
+
+
+class SharedHandle(tuple):
+    pass
+
+
+def create(shape: tuple, dtype=np.float32) -> tuple[str, np.ndarray]:
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    memory = SharedMemory(create=True, size=size)
+    blocks[memory.name] = memory
+    created.add(memory.name)
+    return memory.name, np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+
+
+def attach(name: str, shape: tuple, dtype=np.float32) -> np.ndarray:
+    if name not in blocks:
+        blocks[name] = SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=blocks[name].buf)
+
+
+def unlink(name: str):
+    if name in created:
+        created.discard(name)
+        blocks[name].unlink()
+
+
+def release(names: list[str]):
+    for name in names:
+        unlink(name)
+        memory = blocks.pop(name, None)
+        if memory is None: continue
+        try:
+            memory.close()
+        except BufferError:
+            # Ainda há arrays apontando para o bloco, então ele fica mapeado até o fim do processo
+            blocks[name] = memory
+
+
+@atexit.register
+def unlinkAll():
+    for name in list(created):
+        unlink(name)
+
+
+def share(value):
+    if isinstance(value, np.ndarray):
+        name, array = create(value.shape, value.dtype)
+        array[...] = value
+        return SharedHandle((name, value.shape, value.dtype.str))
+    if isinstance(value, (list, tuple)):
+        return type(value)(share(item) for item in value)
+    return value
+
+
+def restore(value):
+    if isinstance(value, SharedHandle):
+        name, shape, dtype = value
+        return attach(name, shape, np.dtype(dtype))
+    if isinstance(value, (list, tuple)):
+        return type(value)(restore(item) for item in value)
+    return value
+
+
+def shareState(obj, keys: tuple[str, ...]) -> dict:
+    # Cada array é copiado para a memória compartilhada uma única vez por objeto
+    with lock:
+        cache = obj.__dict__.setdefault('sharedHandles', {})
+        state = obj.__dict__.copy()
+        state.pop('sharedHandles')
+        for key in keys:
+            value = state[key]
+            if key not in cache or cache[key][0] is not value:
+                if key in cache:
+                    release(handleNames(cache[key][1]))
+                cache[key] = (value, share(value))
+            state[key] = cache[key][1]
+        return state
+
+
+def restoreState(state: dict, keys: tuple[str, ...]) -> dict:
+    for key in keys:
+        state[key] = restore(state[key])
+    return state
+
+
+def handleNames(value) -> list[str]:
+    if isinstance(value, SharedHandle):
+        return [value[0]]
+    if isinstance(value, (list, tuple)):
+        return [name for item in value for name in handleNames(item)]
+    return []
+
+
+def releaseState(obj) -> list[str]:
+    # Apaga os blocos criados por shareState e devolve os nomes para os processos soltarem os seus
+    with lock:
+        cache = obj.__dict__.pop('sharedHandles', {})
+    names = [name for _, handle in cache.values() for name in handleNames(handle)]
+    release(names)
+    return names
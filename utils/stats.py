@@ -0,0 +1,149 @@
+import time
+import numpy as np
+from utils import kernels
+
+
+RAY_KINDS = ('primary', 'shadow', 'bounce')
+STAGES = ('trace', 'shadow', 'texture', 'background')
+PRIMITIVE_NAMES = ('sphere', 'plane', 'triangle', 'circle', 'cone', 'cylinder')
+DISABLED = np.zeros(0, dtype=np.int64)
+NO_WORK = np.zeros(0, dtype=np.float64)
+
+
+class RenderStats:
+    def __init__(self):
+        self.counters = np.zeros(kernels.N_COUNTERS, dtype=np.int64)
+        self.rays = dict.fromkeys(RAY_KINDS, 0)
+        self.lookups = {'texture': 0, 'cubemap': 0}
+        self.times = dict.fromkeys(STAGES + ('total',), 0.)
+        self.tasks = 0
+
+    def __add__(self, other: 'RenderStats') -> 'RenderStats':
+        result = RenderStats()
+        for stats in (self, other):
+            result.counters += stats.counters
+            result.tasks += stats.tasks
+            for table, values in ((result.rays, stats.rays), (result.lookups, stats.lookups), (result.times, stats.times)):
+                for key, value in values.items():
+                    table[key] += value
+
+        return result
+
+    @property
+    def totalRays(self) -> int:
+        return sum(self.rays.values())
+
+    def toDict(self) -> dict:
+        # O tempo de sombreamento é o que sobra do tempo dos tiles fora dos estágios medidos
+        times = dict(self.times)
+        times['shading'] = max(times['total'] - sum(times[stage] for stage in STAGES), 0.)
+        return {
+            'tasks': self.tasks,
+            'rays': dict(self.rays, total=self.totalRays),
+            'bvhNodes': int(self.counters[kernels.COUNT_NODES]),
+            'tests': {name: int(self.counters[kernels.COUNT_TESTS + kind]) for kind, name in enumerate(PRIMITIVE_NAMES)},
+            'hits': {name: int(self.counters[kernels.COUNT_HITS + kind]) for kind, name in enumerate(PRIMITIVE_NAMES)},
+            'lookups': dict(self.lookups),
+            'times': times,
+        }
+
+
+# Coletor do processo atual; fica None enquanto as estatísticas estão desligadas
+current: RenderStats = None
+
+# Contadores usados pelo mapa de calor quando as estatísticas estão desligadas
+tracking: np.ndarray = None
+
+
+def counters() -> np.ndarray:
+    if current is not None:
+        return current.counters
+
+    return DISABLED if tracking is None else tracking
+
+
+def track(enabled: bool):
+    global tracking
+    if not enabled:
+        tracking = None
+    elif tracking is None:
+        tracking = np.zeros(kernels.N_COUNTERS, dtype=np.int64)
+
+
+def work() -> int:
+    # Nós da BVH visitados e testes de interseção contados até agora no processo
+    values = counters()
+    return int(kernels.total_work(values)) if len(values) > 0 else 0
+
+
+def record(stage: str, t0: float, kind: str = None, rays=0):
+    if current is None: return
+
+    current.times[stage] += time.perf_counter() - t0
+    if kind is not None:
+        current.rays[kind] += rays
+
+
+def lookup(kind: str, t0: float, count=1):
+    if current is None: return
+
+    current.lookups[kind] += count
+    current.times['texture' if kind == 'texture' else 'background'] += time.perf_counter() - t0
+
+
+def summarize(workers: dict[int, RenderStats], elapsed: float, occluders: dict[int, np.ndarray] = None, tiles: list[tuple[tuple, float]] = None) -> dict:
+    total = sum(workers.values(), RenderStats())
+    summary = total.toDict()
+    summary['elapsed'] = elapsed
+    # Contadores do cache de oclusão por luz: [testes, bloqueados, acertos do cache]
+    summary['occluders'] = {
+        int(light): {'tests': int(tests), 'blocked': int(blocked), 'cacheHits': int(hits)}
+        for light, (tests, blocked, hits) in sorted((occluders or {}).items())
+    }
+    summary['raysPerSecond'] = total.totalRays / elapsed if elapsed > 0 else 0.
+    # Tempo de cada tile renderizado, somando todos os passos
+    times = np.array([seconds for _, seconds in tiles or []])
+    summary['tiles'] = {
+        'count': len(times),
+        'mean': float(times.mean()) if len(times) else 0.,
+        'median': float(np.median(times)) if len(times) else 0.,
+        'max': float(times.max()) if len(times) else 0.,
+        'slowest': list(max(tiles, key=lambda timing: timing[1])[0]) if len(times) else None,
+    }
+    summary['workers'] = {index: stats.toDict() for index, stats in sorted(workers.items())}
+    return summary
+
+
+def report(summary: dict) -> str:
+    rays, times = summary['rays'], summary['times']
+    lines = [
+        'Estatísticas:',
+        f'  {rays["total"]} raios em {summary["elapsed"]:.2f}s ({summary["raysPerSecond"]:.0f} raios/s) - '
+        f'{rays["primary"]} primários, {rays["shadow"]} de sombra, {rays["bounce"]} de rebatimento',
+        f'  {summary["bvhNodes"]} nós da BVH visitados ({summary["bvhNodes"] / max(rays["total"], 1):.1f} por raio)',
+    ]
+    for name in PRIMITIVE_NAMES:
+        tests, hits = summary['tests'][name], summary['hits'][name]
+        if tests > 0:
+            lines.append(f'  {name}: {tests} testes, {hits} acertos ({hits / tests * 100:.1f}%)')
+    lines.append(f'  {summary["lookups"]["texture"]} consultas de textura, {summary["lookups"]["cubemap"]} de cubemap')
+    for light, occluder in summary['occluders'].items():
+        tests, blocked = occluder['tests'], occluder['blocked']
+        lines.append(
+            f'  cache de oclusão da luz {light}: {tests} testes, {blocked / max(tests, 1) * 100:.1f}% bloqueados, '
+            f'{occluder["cacheHits"] / max(blocked, 1) * 100:.1f}% dos bloqueios resolvidos pelo cache'
+        )
+    tiles = summary['tiles']
+    if tiles['count'] > 0:
+        lines.append(
+            f'  {tiles["count"]} tiles - média {tiles["mean"] * 1000:.1f}ms, mediana {tiles["median"] * 1000:.1f}ms, '
+            f'máximo {tiles["max"] * 1000:.1f}ms no tile {tuple(tiles["slowest"])}'
+        )
+    lines.append('  Tempo por estágio: ' + ', '.join(
+        f'{stage} {times[stage]:.2f}s ({times[stage] / max(times["total"], 1e-9) * 100:.0f}%)'
+        for stage in STAGES + ('shading',)
+    ))
+    for index, worker in summary['workers'].items():
+        lines.append(f'  processo {index}: {worker["tasks"]} tiles, {worker["rays"]["total"]} raios, {worker["times"]["total"]:.2f}s')
+
+    return '\n'.join(lines)
@@ -0,0 +1,51 @@
+import os
+import cv2
+import numpy as np
+from utils import shared
+
+
+# Cada arquivo é decodificado uma única vez por execução, na primeira
+# consulta. Os processos de renderização recebem os níveis pelos nomes dos
+# blocos de memória compartilhada e nunca leem o arquivo.
+levels: dict[tuple[str, bool], list[np.ndarray]] = {}
+handles: dict[tuple[str, bool], list[shared.SharedHandle]] = {}
+
+
+def build_mipmaps(image: np.ndarray) -> list[np.ndarray]:
+    pyramid = [image]
+    while image.shape[0] > 1 or image.shape[1] > 1:
+        size = (max(image.shape[1] // 2, 1), max(image.shape[0] // 2, 1))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        pyramid.append(image)
+
+    return pyramid
+
+
+def getLevels(path: str, swapChannels=False) -> list[np.ndarray]:
+    key = (path, swapChannels)
+    if key not in levels:
+        if key in handles:
+            levels[key] = shared.restore(handles[key])
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'Textura não encontrada em {path}')
+
+            image = cv2.imread(path)
+            if swapChannels:
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            levels[key] = build_mipmaps(image)
+
+    return levels[key]
+
+
+def export(path: str, swapChannels=False) -> list[shared.SharedHandle]:
+    key = (path, swapChannels)
+    with shared.lock:
+        if key not in handles:
+            handles[key] = shared.share(getLevels(path, swapChannels))
+
+    return handles[key]
+
+
+def register(path: str, swapChannels: bool, levelHandles: list[shared.SharedHandle]):
+    handles.setdefault((path, swapChannels), levelHandles)
@@ -87,11 +87,51 @@ def rotate2D(v, angle):
 
 
 @numba.jit
-def random_unit_vector():
-    theta = np.random.uniform(0, math.pi * 2)
-    phi = np.random.uniform(0, math.pi)
-    cosT, sinT = math.cos(theta), math.sin(theta)
-    cosP, sinP = math.cos(phi), math.sin(phi)
+def random_unit_vector(uv: np.ndarray = None):
+    if uv is None:
+        uv = np.random.random(2)
 
-    vec = np.array([cosT * sinP, sinT * sinP, cosP])
+    # z uniforme em [-1, 1] distribui os pontos uniformemente pela área da esfera
+    theta = uv[0] * math.pi * 2
+    cosP = 1. - 2. * uv[1]
+    sinP = math.sqrt(max(0., 1. - cosP * cosP))
+
+    vec = np.array([math.cos(theta) * sinP, math.sin(theta) * sinP, cosP])
     return vec
+
+
+def random_unit_vectors(n: int, uv: np.ndarray = None) -> np.ndarray:
+    if uv is None:
+        uv = np.random.random((n, 2))
+
+    theta = uv[:, 0] * math.pi * 2
+    cosP = 1. - 2. * uv[:, 1]
+    sinP = np.sqrt(np.maximum(0., 1. - cosP * cosP))
+    return np.stack((np.cos(theta) * sinP, np.sin(theta) * sinP, cosP), axis=1)
+
+
+def cosine_hemisphere_vectors(normals: np.ndarray, uv: np.ndarray = None) -> np.ndarray:
+    if uv is None:
+        uv = np.random.random((len(normals), 2))
+
+    # Base ortonormal em torno de cada normal (Duff et al., 2017)
+    nx, ny, nz = normals[:, 0], normals[:, 1], normals[:, 2]
+    sign = np.where(nz >= 0., 1., -1.)
+    a = -1. / (sign + nz)
+    b = nx * ny * a
+    tangents = np.stack((1. + sign * nx * nx * a, sign * b, -sign * nx), axis=1)
+    bitangents = np.stack((b, sign + ny * ny * a, -ny), axis=1)
+
+    # Método de Malley: pontos uniformes no disco projetados no hemisfério
+    r = np.sqrt(uv[:, 0])
+    phi = uv[:, 1] * math.pi * 2
+    z = np.sqrt(np.maximum(0., 1. - uv[:, 0]))
+    return (r * np.cos(phi))[:, None] * tangents + (r * np.sin(phi))[:, None] * bitangents + z[:, None] * normals
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1)[:, None]
+
+
+def reflect_rows(vectors: np.ndarray, normals: np.ndarray) -> np.ndarray:
+    return vectors - 2 * np.einsum('ij,ij->i', vectors, normals)[:, None] * normals
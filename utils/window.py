@@ -18,6 +18,8 @@ class Window:
             pygame.K_ESCAPE: self.close,
             pygame.K_p: self.screenshot,
             pygame.K_r: self.rerender,
+            pygame.K_s: self.stop,
+            pygame.K_h: self.toggleHeatmap,
         }
         self.buttons = {
             pygame.BUTTON_LEFT: self.pick,
@@ -74,21 +76,49 @@ class Window:
 
     def close(self):
         self.closed = True
+        self.scene.close()
 
     def screenshot(self):
-        cv2.imwrite(
-            f'screenshots/{dt.now().strftime("%Y-%m-%d_%H-%M-%S")}.png',
-            cv2.flip(self.scene.camera.buffer[...,::-1].astype('uint8'), 0),
-        )
+        self.scene.saveImage(f'screenshots/{dt.now().strftime("%Y-%m-%d_%H-%M-%S")}.png')
 
     def rerender(self):
         self.scene.loaded = False
 
+    def stop(self):
+        self.scene.stop()
+
+    def relight(self):
+        # Com o G-buffer válido, trocar luzes ou sombras só refaz a iluminação; sem ele
+        # a mudança continua esperando o próximo render
+        if self.scene.updateCamera is not None:
+            fallback = 'a câmera mudou'
+        else:
+            fallback = self.scene.camera.getRelightFallback(self.scene)
+        if fallback is None:
+            self.rerender()
+            return
+
+        print(f'Sem reacendimento: {fallback}. A mudança aparece na próxima renderização completa (comando render)')
+
+    def toggleHeatmap(self):
+        camera = self.scene.camera
+        if not camera.heatmap:
+            # O custo por pixel só é medido numa renderização com o mapa de calor ligado
+            camera.heatmap = True
+            self.scene.showHeatmap = True
+            self.rerender()
+            return
+
+        self.scene.showHeatmap = not self.scene.showHeatmap
+        if self.scene.showHeatmap and hasattr(camera, 'costs'):
+            _, scale = camera.getHeatmap()
+            print(f'\nMapa de calor: de 0 a {scale:.0f} nós da BVH + testes de interseção por amostra')
+
     def renderSelectedProps(self):
         if self.updateSelected is False: return
 
         self.updateSelected = False
-        self.scene.image = self.scene.camera.buffer.copy()
+        self.scene.image = self.scene.camera.display.copy()
         if self.selected is None: return
 
         for idx, line in enumerate(self.selected.getDescription().split('\n')):
@@ -97,45 +127,41 @@ class Window:
     def pick(self):
         if self.scene.loaded is False: return
 
+        # O buffer de objetos da última renderização responde sem traçar raios
         [x, y] = pygame.mouse.get_pos()
-        occurrences = {}
-        width, height = self.scene.camera.resolution
+        camera = self.scene.camera
+        width, height = camera.resolution
         brush = 5
-        for dx, dy in np.ndindex((brush, brush)):
-            px, py = (x + dx - brush//2), (y + dy - brush//2)
-            if (
-                0 <= px < width and
-                0 <= py < height
-            ):
-                point, obj = self.scene.rayTrace(self.scene.camera.getRay(px, height - (py)))
-
-                if obj is not None:
-                    occurrence = occurrences.get(obj, {'amount': 0, 'points': []})
-                    occurrence['amount'] += 1
-                    occurrence['points'].append(point)
-                    occurrences[obj] = occurrence
+        px, py = np.mgrid[x - brush//2:x + brush//2 + 1, y - brush//2:y + brush//2 + 1].reshape(2, -1)
+        inside = (0 <= px) & (px < width) & (0 <= py) & (py < height)
+        # O buffer está de baixo para cima
+        ids = camera.objectIds[height - 1 - py[inside], px[inside]]
+        points = camera.hitPoints[height - 1 - py[inside], px[inside]]
 
         self.updateSelected = True
-        obj = max(occurrences, key=lambda x: occurrences[x]['amount'], default=None)
-        if obj is None:
+        hits = ids >= 0
+        if not hits.any():
             self.selected = None
             return
 
-        self.selectedPoint = sum(occurrences[obj]['points']) / len(occurrences[obj]['points'])
-        while obj.superObject is not None and (not obj.superObject.isBVH or obj.superObject.superObject is not None):
-            obj = obj.superObject
-
-        self.selected = obj
+        values, amounts = np.unique(ids[hits], return_counts=True)
+        selected = values[np.argmax(amounts)]
+        self.selectedPoint = points[ids == selected].mean(axis=0)
+        self.selected = self.scene.pickables[selected]
 
     def endGrab(self):
+        # Os processos ainda usam a geometria compilada, então o objeto só se move entre renderizações
+        if self.scene.loading: return
+
         if self.selected is not None:
             x, y = pygame.mouse.get_pos()
-            rayD = self.scene.camera.rayDirections[x, -y]
             p = Plane(self.selectedPoint, -self.scene.camera.direction)
             p.preCalc()
-            point = p.intersects(self.scene.camera.getRay(x, -y))
+            point = p.intersects(self.scene.camera.getRay(x, self.scene.camera.resolution[1] - 1 - y))
             translation = point - self.selectedPoint
+            before = self.scene.getBounds(self.selected)
             self.selected.translate(translation)
+            self.scene.moved(self.selected, before)
             self.selectedPoint = point
             self.updateSelected = True
             if (self.selected.superObject is not None):